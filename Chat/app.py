@@ -1,14 +1,27 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, Response, stream_with_context
 from flask_bcrypt import Bcrypt
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
 import requests
-from datetime import datetime
-import os, secrets, json, re
-from llama_client import call_ollama   # your function that calls LLaMA
+from datetime import datetime, timedelta
+import os, secrets, json, re, time, random, base64
+import llama_client
+from llama_client import call_ollama, stream_ollama, MODEL, OPTIONS   # your functions that call LLaMA
+from intents import IntentIndex
+from prompt_builder import build_history_prompt
+from conversation_store import ConversationStore, MongoConversationStore, BACKEND as CONVO_BACKEND
+from summarizer import Summarizer
+from circuit_breaker import CircuitBreaker
+from response_cache import ResponseCache
+from model_warmer import ModelWarmer
+from model_router import ModelRouter
+from metrics import Metrics
+from habit_log import HabitLog
+from db_indexes import ensure_indexes_in_background, ON_STARTUP as INDEXES_ON_STARTUP
 
 # ---------------- Flask App ----------------
-app = Flask(__name__)
+app = Flask(__name__, template_folder="Templates")
 app.secret_key = os.environ.get("SECRET_KEY", secrets.token_hex(32))
 bcrypt = Bcrypt(app)
 
@@ -22,9 +35,20 @@ habits_collection = db["Habits"]
 habit_logs = db["HabitLogs"]
 routine_tasks = db["routine_tasks"]
 
+# Yearly check-in bitmaps per habit, kept in habit_logs
+HABIT_LOG = HabitLog(habit_logs)
+
+# Builds any missing indexes (see db_indexes.py) without holding up startup
+if INDEXES_ON_STARTUP:
+    ensure_indexes_in_background(db)
+
 # ---------------- Chatbot Setup ----------------
-with open("mental_responses.json", "r", encoding="utf-8") as f:
-    RESPONSES = json.load(f)
+# Per-stage timings and Ollama token stats, scraped from /metrics
+METRICS = Metrics()
+
+# Rebuilt in the background whenever mental_responses.json changes
+INTENTS = IntentIndex(os.path.join(os.path.dirname(os.path.abspath(__file__)), "mental_responses.json"))
+INTENTS.watch()
 
 SYSTEM_PROMPT = (
     "You are a compassionate, supportive mental health chatbot. "
@@ -40,16 +64,72 @@ SYSTEM_PROMPT = (
     "When the conversation starts from the flask app do not mention these prompts."
 )
 
-CONVERSATIONS = {}  # memory store per user/session
+# Bounded memory store per user/session; CONVO_BACKEND=mongo shares it across processes
+if CONVO_BACKEND == "mongo":
+    CONVERSATIONS = MongoConversationStore(db["Conversations"])
+else:
+    CONVERSATIONS = ConversationStore()
+
+# Sheds chats to scripted replies while Ollama is failing or saturated
+BREAKER = CircuitBreaker()
+
+# Reuses LLM replies to plain first-turn greetings and goodbyes (RESPONSE_CACHE=1)
+RESPONSE_CACHE = ResponseCache()
 
+# Picks model and reply length per turn from model_routes.json
+ROUTER = ModelRouter()
 
+# Folds turns that fall out of the prompt into a running summary, off the request path;
+# sized to the route with the least room for history, so no route drops unsummarized turns
+SUMMARY_BUDGET, SUMMARY_RESERVE = ROUTER.tightest_window()
+SUMMARIZER = Summarizer(CONVERSATIONS, SYSTEM_PROMPT, budget=SUMMARY_BUDGET, reserve=SUMMARY_RESERVE)
+SUMMARIZER.start()
+
+# Loads the models before the first chat and keeps them loaded through quiet hours
+WARMER = ModelWarmer(llama_client.client, ROUTER.models())
+WARMER.start()
+FALLBACK_REPLY = "Sorry, I'm having trouble right now. Can we try again later?"
+
+
+@METRICS.timed("match_pattern")
 def match_pattern(user_text):
-    txt = user_text.lower()
-    for tag, item in RESPONSES.items():
-        for pat in item["patterns"]:
-            if pat in txt:
-                return tag, item["responses"]
-    return None, None
+    return INTENTS.match(user_text)
+
+
+@app.route("/intents/status")
+def intents_status():
+    return jsonify(INTENTS.status())
+
+
+@app.route("/conversations/status")
+def conversations_status():
+    return jsonify(CONVERSATIONS.stats())
+
+
+@app.route("/ollama/status")
+def ollama_status():
+    return jsonify({
+        "backends": llama_client.client.backends.status(),
+        "breaker": BREAKER.status(),
+        "single_flight": {"sync": llama_client.client.flights.status(),
+                          "async": llama_client.async_client.flights.status()},
+        "response_cache": RESPONSE_CACHE.status(),
+        "models": WARMER.status(),
+        "routes": ROUTER.status()
+    })
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/ready")
+def ready():
+    # Load balancers hold traffic back until the model answers without a cold load
+    if WARMER.ready():
+        return jsonify({"ready": True})
+    return jsonify({"ready": False, "models": WARMER.status()}), 503
 
 
 # ---------------- User Auth ----------------
@@ -70,7 +150,11 @@ def register():
             return redirect(url_for("register"))
 
         hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
-        users.insert_one({"username": username, "password": hashed_pw})
+        try:
+            users.insert_one({"username": username, "password": hashed_pw})
+        except DuplicateKeyError:
+            # Same name registered between the check above and now; the unique index catches it
+            return redirect(url_for("register"))
         return redirect(url_for("login"))
 
     return render_template("register.html", error=error)
@@ -109,19 +193,58 @@ def logout():
 
 
 # ---------------- Scheduler ----------------
+SCHEDULE_PAGE_SIZE = int(os.environ.get("SCHEDULE_PAGE_SIZE", "20"))
+MAX_SCHEDULE_PAGE_SIZE = 100
+
+
+def schedule_cursor(schedule):
+    """Opaque `after` token for the page that starts past this schedule."""
+    raw = json.dumps([schedule.get("date"), schedule.get("time"), str(schedule["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def schedules_after(token):
+    """Filter for everything sorted after the token's (date, time, _id), or {} for the first page."""
+    try:
+        date, time_, schedule_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        schedule_id = ObjectId(schedule_id)
+    except Exception:
+        return {}
+    return {"$or": [
+        {"date": {"$gt": date}},
+        {"date": date, "time": {"$gt": time_}},
+        {"date": date, "time": time_, "_id": {"$gt": schedule_id}}
+    ]}
+
+
 @app.route("/scheduler_dashboard")
 def scheduler_dashboard():
-    if "username" in session:
-        schedules = list(schedules_collection.find())
-        return render_template("scheduler_dashboard.html", schedules=schedules)
-    return redirect(url_for("login"))
+    user_id = session.get("user_id")
+    if "username" not in session or not user_id:
+        return redirect(url_for("login"))
+
+    # Keyset pagination on the (user_id, date, time, _id) index: every page
+    # is one index range scan however many schedules come before it
+    size = max(1, min(request.args.get("size", SCHEDULE_PAGE_SIZE, type=int), MAX_SCHEDULE_PAGE_SIZE))
+    query = {"user_id": ObjectId(user_id)}
+    after = request.args.get("after")
+    if after:
+        query.update(schedules_after(after))
+    schedules = list(
+        schedules_collection.find(query)
+        .sort([("date", 1), ("time", 1), ("_id", 1)])
+        .limit(size + 1)
+    )
+    next_after = schedule_cursor(schedules[size - 1]) if len(schedules) > size else None
+    return render_template("scheduler_dashboard.html", schedules=schedules[:size],
+                           next_after=next_after, size=size, paged=bool(after))
 
 
 @app.route("/update_schedules/<schedule_id>", methods=["GET", "POST"])
 def update_scheduler(schedule_id):
-    if "username" in session:
+    if "username" in session and session.get("user_id"):
         schedules_collection.update_one(
-            {"_id": ObjectId(schedule_id)},
+            {"_id": ObjectId(schedule_id), "user_id": ObjectId(session["user_id"])},
             {"$set": {"status": "done"}}
         )
         return redirect(url_for("scheduler_dashboard"))
@@ -130,7 +253,7 @@ def update_scheduler(schedule_id):
 
 @app.route("/add_schedule", methods=["GET", "POST"])
 def add_schedule():
-    if "username" not in session:
+    if "username" not in session or not session.get("user_id"):
         return redirect(url_for("login"))
 
     if request.method == "POST":
@@ -139,6 +262,7 @@ def add_schedule():
         time = request.form.get("time")
 
         schedules_collection.insert_one({
+            "user_id": ObjectId(session["user_id"]),
             "task": task,
             "date": date,
             "time": time,
@@ -157,6 +281,10 @@ def routine_dashboard():
         return redirect(url_for("login"))
 
     tasks = list(routine_tasks.find({"user_id": ObjectId(user_id)}))
+    # Settle the days that passed since this user last looked before showing them
+    if any(task.get("last_updated", "") < datetime.now().strftime("%Y-%m-%d") for task in tasks):
+        reset_task_status(ObjectId(user_id))
+        tasks = list(routine_tasks.find({"user_id": ObjectId(user_id)}))
     all_done = all(task["completed"] for task in tasks) if tasks else False
 
     return render_template("routine_dashboard.html", tasks=tasks, all_done=all_done)
@@ -208,12 +336,13 @@ def delete_task(task_id):
     return redirect(url_for("routine_dashboard"))
 
 
-def reset_task_status():
+def reset_task_status(user_id=None):
+    """Unchecks routine tasks last touched before today, for one user or everyone."""
     today = datetime.now().strftime("%Y-%m-%d")
-    routine_tasks.update_many(
-        {"last_updated": {"$lt": today}},
-        {"$set": {"completed": False, "last_updated": today}}
-    )
+    query = {"last_updated": {"$lt": today}}
+    if user_id:
+        query["user_id"] = user_id
+    routine_tasks.update_many(query, {"$set": {"completed": False, "last_updated": today}})
 
 
 # ---------------- Habits ----------------
@@ -224,7 +353,22 @@ def habit_dashboard():
         return redirect(url_for("login"))
 
     habits = list(habits_collection.find({"user_id": ObjectId(user_id)}))
-    return render_template("habit_dashboard.html", habits=habits)
+    # Settle the days that passed since this user last looked before showing them
+    if any(habit.get("last_updated", "") < datetime.now().strftime("%Y-%m-%d") for habit in habits):
+        finalize_habits(ObjectId(user_id))
+        habits = list(habits_collection.find({"user_id": ObjectId(user_id)}))
+    today = datetime.now().date()
+    return render_template("habit_dashboard.html", habits=[habit_stats(habit, today) for habit in habits])
+
+
+def habit_stats(habit, today):
+    """Adds what the dashboard shows: the run including today, the best run and the completion rate."""
+    current = habit.get("streak", 0) + (1 if habit.get("temp_checked") else 0)
+    tracked = (today - habit["_id"].generation_time.date()).days + 1
+    habit["current_streak"] = current
+    habit["longest_streak"] = max(habit.get("longest_streak", 0), current)
+    habit["completion"] = round(100 * habit.get("done_days", 0) / max(1, tracked))
+    return habit
 
 
 @app.route("/add_habit", methods=["GET", "POST"])
@@ -240,6 +384,8 @@ def add_habit():
                 "user_id": ObjectId(user_id),
                 "habit": habit_name,
                 "streak": 0,
+                "longest_streak": 0,
+                "done_days": 0,
                 "temp_checked": False,
                 "last_updated": datetime.now().strftime("%Y-%m-%d")
             })
@@ -253,44 +399,77 @@ def update_habit(habit_id):
     if not user_id:
         return redirect(url_for("login"))
 
+    query = {"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)}
+    habit = habits_collection.find_one(query, {"last_updated": 1})
+    if not habit:
+        return redirect(url_for("habit_dashboard"))
+    # A page left open overnight must not tick yesterday's box
+    if habit.get("last_updated", "") < datetime.now().strftime("%Y-%m-%d"):
+        finalize_habits(ObjectId(user_id))
+
     completed = "completed" in request.form
-    habits_collection.update_one(
-        {"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)},
-        {"$set": {"temp_checked": completed}}
-    )
+    update = {"$set": {"temp_checked": completed}}
+    if HABIT_LOG.set_day(ObjectId(habit_id), ObjectId(user_id), datetime.now().date(), completed):
+        update["$inc"] = {"done_days": 1 if completed else -1}
+    habits_collection.update_one(query, update)
     return redirect(url_for("habit_dashboard"))
 
 
+@app.route("/habits/<habit_id>/heatmap")
+def habit_heatmap(habit_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "not logged in"}), 401
+
+    if not ObjectId.is_valid(habit_id):
+        return jsonify({"error": "invalid habit id"}), 400
+    if not habits_collection.find_one({"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)}, {"_id": 1}):
+        return jsonify({"error": "habit not found"}), 404
+
+    year = request.args.get("year", datetime.now().year, type=int)
+    return jsonify(HABIT_LOG.heatmap(ObjectId(habit_id), ObjectId(user_id), year))
+
+
 @app.route("/delete_habit/<habit_id>", methods=["POST"])
 def delete_habit(habit_id):
     user_id = session.get("user_id")
     if not user_id:
         return redirect(url_for("login"))
 
-    habits_collection.delete_one({"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)})
+    result = habits_collection.delete_one({"_id": ObjectId(habit_id), "user_id": ObjectId(user_id)})
+    if result.deleted_count:
+        HABIT_LOG.delete(ObjectId(habit_id), ObjectId(user_id))
     return redirect(url_for("habit_dashboard"))
 
 
-def finalize_habits():
+def finalize_habits(user_id=None):
+    """
+    Day rollover for habits not settled today, for one user or everyone.
+    The streak grows only if the habit was checked on its last day and that
+    day was yesterday; an unchecked day or any day with no visit at all in
+    between resets it, and longest_streak keeps the best run settled so
+    far. Runs as a single update with an aggregation pipeline,
+    so Mongo does the work without a round trip per habit.
+    """
     today = datetime.now().strftime("%Y-%m-%d")
-    habits = habits_collection.find()
-
-    for habit in habits:
-        last_date = habit.get("last_updated")
-        checked = habit.get("temp_checked", False)
-
-        update_data = {
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    query = {"last_updated": {"$lt": today}}
+    if user_id:
+        query["user_id"] = user_id
+
+    checked = {"$eq": ["$temp_checked", True]}
+    kept = {"$and": [checked, {"$eq": ["$last_updated", yesterday]}]}
+    # The run through the last settled day, taken before a gap resets it
+    run = {"$add": [{"$ifNull": ["$streak", 0]}, {"$cond": [checked, 1, 0]}]}
+    result = habits_collection.update_many(query, [
+        {"$set": {
+            "longest_streak": {"$max": [{"$ifNull": ["$longest_streak", 0]}, run]},
+            "streak": {"$cond": [kept, run, 0]},
             "temp_checked": False,
             "last_updated": today
-        }
-
-        if last_date != today:
-            if checked:
-                update_data["streak"] = habit["streak"] + 1
-            else:
-                update_data["streak"] = 0
-
-            habits_collection.update_one({"_id": habit["_id"]}, {"$set": update_data})
+        }}
+    ])
+    return result.modified_count
 
 
 # ---------------- Chatbot ----------------
@@ -301,6 +480,90 @@ def chatbot():
     return redirect(url_for("login"))
 
 
+@METRICS.timed("route")
+def pick_route(session_id, user_text, tag):
+    """Model and options for this turn, before the user turn is recorded."""
+    return ROUTER.route(user_text, tag, len(CONVERSATIONS.messages(session_id)))
+
+
+@METRICS.timed("prompt_build")
+def build_prompt(session_id, user_text, model=MODEL, options=None):
+    """
+    Returns (prompt, context). While the session still holds Ollama context
+    tokens for the same model, only the new user turn is sent; otherwise the
+    prompt is rebuilt from SYSTEM_PROMPT, the session summary and as much
+    recent history as fits the token budget.
+    """
+    CONVERSATIONS.append(session_id, "user", user_text)
+    SUMMARIZER.submit(session_id)
+
+    cached = CONVERSATIONS.get_context(session_id)
+    options = dict(OPTIONS, **(options or {}))
+    room = options["num_ctx"] - options["num_predict"]
+    if cached and cached["model"] == model and len(cached["tokens"]) < room:
+        return f"User: {user_text}\nAssistant:", cached["tokens"]
+
+    summary = CONVERSATIONS.get_summary(session_id)
+    return build_history_prompt(SYSTEM_PROMPT, CONVERSATIONS.messages(session_id), summary,
+                                budget=options["num_ctx"], reserve=options["num_predict"]), None
+
+
+def remember_context(session_id, model, meta):
+    CONVERSATIONS.set_context(session_id, model, meta.get("context"))
+
+
+def crisis_reply(session_id, user_text, responses):
+    """
+    Records the scripted crisis turn, so the model sees it on the next turn
+    and the session never again looks like a fresh, cacheable first turn.
+    """
+    CONVERSATIONS.append(session_id, "user", user_text)
+    CONVERSATIONS.append(session_id, "assistant", responses[0])
+    CONVERSATIONS.set_context(session_id, MODEL, None)
+    return responses[0]
+
+
+def cache_key_for(session_id, user_text, prompt, context, route):
+    """Response cache key for this turn, or None if it must not be cached."""
+    if not RESPONSE_CACHE.enabled or context is not None:
+        return None
+    first_turn = (len(CONVERSATIONS.messages(session_id, last=2)) == 1
+                  and not CONVERSATIONS.get_summary(session_id))
+    if RESPONSE_CACHE.eligible(INTENTS.match_all(user_text), first_turn):
+        return RESPONSE_CACHE.key(prompt, route.model, route.options)
+    return None
+
+
+def finish_call(ticket, route, ok, seconds, meta):
+    """Reports a finished Ollama call to the breaker, the router stats and /metrics."""
+    BREAKER.done(ticket, ok, seconds)
+    ROUTER.observe(route, seconds, ok)
+    if ok is False:
+        METRICS.inc("chat_errors_total", stage="ollama_request")
+    elif ok:
+        METRICS.observe("chat_stage_seconds", seconds, stage="ollama_request")
+        # A call merged into another's request would count its tokens twice
+        if not meta.get("deduplicated"):
+            METRICS.record_ollama(meta)
+
+
+def shed_reply(session_id, responses):
+    """
+    Answers instantly from mental_responses.json when the LLM call is shed.
+    Drops the stored context like crisis_reply, so the next turn's prompt is
+    rebuilt from the history and includes this exchange.
+    """
+    reply = random.choice(responses or INTENTS.responses["fallback"]["responses"])
+    CONVERSATIONS.append(session_id, "assistant", reply)
+    CONVERSATIONS.set_context(session_id, MODEL, None)
+    return reply
+
+
+def sse(payload, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+
 @app.route("/chat", methods=["POST"])
 def chat():
     data = request.json
@@ -310,28 +573,111 @@ def chat():
     # Scripted crisis handling
     tag, responses = match_pattern(user_text)
     if tag == "suicidal":
-        return jsonify({"reply": responses[0], "tag": tag, "source": "scripted"})
+        reply = crisis_reply(session_id, user_text, responses)
+        return jsonify({"reply": reply, "tag": tag, "source": "scripted"})
 
     # Track conversation
-    if session_id not in CONVERSATIONS:
-        CONVERSATIONS[session_id] = []
-    CONVERSATIONS[session_id].append({"role": "user", "content": user_text})
-
-    convo_text = "".join(
-        f"{msg['role'].capitalize()}: {msg['content']}\n"
-        for msg in CONVERSATIONS[session_id][-6:]
-    )
-    prompt = f"{SYSTEM_PROMPT}\n{convo_text}Assistant:"
-
+    route = pick_route(session_id, user_text, tag)
+    prompt, context = build_prompt(session_id, user_text, route.model, route.options)
+
+    cache_key = cache_key_for(session_id, user_text, prompt, context, route)
+    reply = RESPONSE_CACHE.get(cache_key) if cache_key else None
+    if reply:
+        CONVERSATIONS.append(session_id, "assistant", reply)
+        return jsonify({"reply": reply, "tag": tag or "", "source": "cache"})
+
+    ticket = BREAKER.admit()
+    if not ticket:
+        reply = shed_reply(session_id, responses)
+        return jsonify({"reply": reply, "tag": tag or "", "source": "scripted"})
+
+    meta = {}
+    start = time.monotonic()
     try:
-        reply = call_ollama(prompt)
+        reply = call_ollama(prompt, route.model, context, meta, route.options, session_id)
+        finish_call(ticket, route, True, time.monotonic() - start, meta)
+        if cache_key:
+            RESPONSE_CACHE.put(cache_key, reply)
     except Exception as e:
+        finish_call(ticket, route, False, time.monotonic() - start, meta)
         print("ERROR:", e)  # log the actual error
-        reply = "Sorry, I'm having trouble right now. Can we try again later?"
+        reply = FALLBACK_REPLY
+    remember_context(session_id, route.model, meta)
 
-    CONVERSATIONS[session_id].append({"role": "assistant", "content": reply})
+    CONVERSATIONS.append(session_id, "assistant", reply)
     return jsonify({"reply": reply, "tag": tag or "", "source": "llama"})
 
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    data = request.json
+    session_id = data.get("session_id", session.get("user_id", "anon"))
+    user_text = data.get("message", "")
+
+    # Scripted crisis handling
+    tag, responses = match_pattern(user_text)
+    if tag == "suicidal":
+        reply = crisis_reply(session_id, user_text, responses)
+        body = sse({"token": reply}) + sse({"tag": tag, "source": "scripted"}, event="done")
+        return Response(body, mimetype="text/event-stream")
+
+    route = pick_route(session_id, user_text, tag)
+    prompt, context = build_prompt(session_id, user_text, route.model, route.options)
+
+    cache_key = cache_key_for(session_id, user_text, prompt, context, route)
+    reply = RESPONSE_CACHE.get(cache_key) if cache_key else None
+    if reply:
+        CONVERSATIONS.append(session_id, "assistant", reply)
+        body = sse({"token": reply}) + sse({"tag": tag or "", "source": "cache"}, event="done")
+        return Response(body, mimetype="text/event-stream")
+
+    ticket = BREAKER.admit()
+    if not ticket:
+        reply = shed_reply(session_id, responses)
+        body = sse({"token": reply}) + sse({"tag": tag or "", "source": "scripted"}, event="done")
+        return Response(body, mimetype="text/event-stream")
+
+    outcome = {"ok": None, "start": time.monotonic(), "recorded": False}
+    meta = {}
+
+    def generate():
+        parts = []
+        try:
+            for token in stream_ollama(prompt, route.model, context, meta, route.options, session_id):
+                parts.append(token)
+                yield sse({"token": token})
+            outcome["ok"] = True
+        except Exception as e:
+            outcome["ok"] = False
+            print("ERROR:", e)  # log the actual error
+            if not parts:
+                parts.append(FALLBACK_REPLY)
+                yield sse({"token": FALLBACK_REPLY})
+
+        # Only a finished reply goes into the history
+        reply = "".join(parts).strip()
+        remember_context(session_id, route.model, meta)
+        CONVERSATIONS.append(session_id, "assistant", reply)
+        outcome["recorded"] = True
+        if outcome["ok"] and cache_key:
+            RESPONSE_CACHE.put(cache_key, reply)
+        yield sse({"tag": tag or "", "source": "llama"}, event="done")
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    def closed():
+        if not outcome["recorded"]:
+            # The client left first: the user turn is in the history but not in the old context
+            CONVERSATIONS.set_context(session_id, MODEL, None)
+        finish_call(ticket, route, outcome["ok"], time.monotonic() - outcome["start"], meta)
+
+    # Runs even if the client leaves before the stream starts
+    response.call_on_close(closed)
+    return response
+
 # ---------------- Main ----------------
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,171 @@
+# asgi.py
+# ASGI entry point: `uvicorn asgi:application`
+# /chat and /chat/stream run natively on the event loop, so slow generations
+# wait without holding a thread. Every other route is the regular Flask app,
+# served through asgiref's WSGI adapter (installed with `pip install flask[async]`).
+# Calls that may read the conversation store (a Mongo round trip on a cache
+# miss) run in a worker thread so they never block the event loop.
+import json, time, asyncio
+from http.cookies import SimpleCookie
+
+from app import (app, match_pattern, pick_route, build_prompt, remember_context, crisis_reply, cache_key_for,
+                 finish_call, shed_reply, sse, CONVERSATIONS, BREAKER, RESPONSE_CACHE, FALLBACK_REPLY)
+from llama_client import acall_ollama, astream_ollama
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    flask_app = WsgiToAsgi(app)
+except ImportError:
+    flask_app = None
+
+
+def session_user_id(scope):
+    """Reads user_id from the Flask session cookie, like session.get() in the views."""
+    headers = dict(scope["headers"])
+    cookie = SimpleCookie(headers.get(b"cookie", b"").decode("latin-1"))
+    morsel = cookie.get(app.config["SESSION_COOKIE_NAME"])
+    if not morsel:
+        return None
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(morsel.value).get("user_id")
+    except Exception:
+        return None
+
+
+async def read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return json.loads(body or b"{}")
+
+
+async def send_json(send, payload, status=200):
+    raw = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(raw)).encode())]})
+    await send({"type": "http.response.body", "body": raw})
+
+
+async def chat(scope, receive, send):
+    data = await read_json(receive)
+    session_id = data.get("session_id", session_user_id(scope) or "anon")
+    user_text = data.get("message", "")
+
+    # Scripted crisis handling
+    tag, responses = match_pattern(user_text)
+    if tag == "suicidal":
+        reply = await asyncio.to_thread(crisis_reply, session_id, user_text, responses)
+        return await send_json(send, {"reply": reply, "tag": tag, "source": "scripted"})
+
+    route = await asyncio.to_thread(pick_route, session_id, user_text, tag)
+    prompt, context = await asyncio.to_thread(build_prompt, session_id, user_text, route.model, route.options)
+
+    cache_key = await asyncio.to_thread(cache_key_for, session_id, user_text, prompt, context, route)
+    reply = RESPONSE_CACHE.get(cache_key) if cache_key else None
+    if reply:
+        await asyncio.to_thread(CONVERSATIONS.append, session_id, "assistant", reply)
+        return await send_json(send, {"reply": reply, "tag": tag or "", "source": "cache"})
+
+    ticket = BREAKER.admit()
+    if not ticket:
+        reply = await asyncio.to_thread(shed_reply, session_id, responses)
+        return await send_json(send, {"reply": reply, "tag": tag or "", "source": "scripted"})
+
+    meta = {}
+    start = time.monotonic()
+    ok = None
+    try:
+        reply = await acall_ollama(prompt, route.model, context, meta, route.options, session_id)
+        ok = True
+        if cache_key:
+            RESPONSE_CACHE.put(cache_key, reply)
+    except Exception as e:
+        ok = False
+        print("ERROR:", e)  # log the actual error
+        reply = FALLBACK_REPLY
+    finally:
+        finish_call(ticket, route, ok, time.monotonic() - start, meta)
+    remember_context(session_id, route.model, meta)
+
+    await asyncio.to_thread(CONVERSATIONS.append, session_id, "assistant", reply)
+    await send_json(send, {"reply": reply, "tag": tag or "", "source": "llama"})
+
+
+async def chat_stream(scope, receive, send):
+    data = await read_json(receive)
+    session_id = data.get("session_id", session_user_id(scope) or "anon")
+    user_text = data.get("message", "")
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no")]})
+
+    async def emit(payload, event=None, more=True):
+        await send({"type": "http.response.body", "body": sse(payload, event).encode(), "more_body": more})
+
+    # Scripted crisis handling
+    tag, responses = match_pattern(user_text)
+    if tag == "suicidal":
+        await emit({"token": await asyncio.to_thread(crisis_reply, session_id, user_text, responses)})
+        return await emit({"tag": tag, "source": "scripted"}, event="done", more=False)
+
+    route = await asyncio.to_thread(pick_route, session_id, user_text, tag)
+    prompt, context = await asyncio.to_thread(build_prompt, session_id, user_text, route.model, route.options)
+
+    cache_key = await asyncio.to_thread(cache_key_for, session_id, user_text, prompt, context, route)
+    reply = RESPONSE_CACHE.get(cache_key) if cache_key else None
+    if reply:
+        await asyncio.to_thread(CONVERSATIONS.append, session_id, "assistant", reply)
+        await emit({"token": reply})
+        return await emit({"tag": tag or "", "source": "cache"}, event="done", more=False)
+
+    ticket = BREAKER.admit()
+    if not ticket:
+        await emit({"token": await asyncio.to_thread(shed_reply, session_id, responses)})
+        return await emit({"tag": tag or "", "source": "scripted"}, event="done", more=False)
+
+    parts = []
+    meta = {}
+    start = time.monotonic()
+    ok = None
+    try:
+        async for token in astream_ollama(prompt, route.model, context, meta, route.options, session_id):
+            parts.append(token)
+            await emit({"token": token})
+        ok = True
+    except Exception as e:
+        ok = False
+        print("ERROR:", e)  # log the actual error
+        if not parts:
+            parts.append(FALLBACK_REPLY)
+            await emit({"token": FALLBACK_REPLY})
+    finally:
+        finish_call(ticket, route, ok, time.monotonic() - start, meta)
+
+    # Only a finished reply goes into the history
+    reply = "".join(parts).strip()
+    remember_context(session_id, route.model, meta)
+    await asyncio.to_thread(CONVERSATIONS.append, session_id, "assistant", reply)
+    if ok and cache_key:
+        RESPONSE_CACHE.put(cache_key, reply)
+    await emit({"tag": tag or "", "source": "llama"}, event="done", more=False)
+
+
+ROUTES = {"/chat": chat, "/chat/stream": chat_stream}
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while (await receive())["type"] != "lifespan.shutdown":
+            await send({"type": "lifespan.startup.complete"})
+        return await send({"type": "lifespan.shutdown.complete"})
+
+    route = ROUTES.get(scope["path"])
+    if route and scope["method"] == "POST":
+        return await route(scope, receive, send)
+    if flask_app is None:
+        return await send_json(send, {"error": "install asgiref to serve the Flask routes over ASGI"}, 501)
+    return await flask_app(scope, receive, send)
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Run from the Chat folder, e.g. `python -m benchmarks.bench_client_pool`
@@ -0,0 +1,69 @@
+# benchmarks/bench_async_chat.py
+# 200 simultaneous chats against a mock Ollama with injected latency:
+# the sync Flask /chat on a fixed thread pool vs the ASGI /chat on one event loop.
+import sys, time, json, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import llama_client
+from benchmarks.mock_ollama import start_mock_ollama
+
+CHATS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+THREADS = 8
+
+
+def report(label, latencies, elapsed):
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<26} {len(latencies)} chats  wall {elapsed:.2f}s  p50 {p50:.2f}s  p95 {p95:.2f}s")
+
+
+# Latencies run from the moment the whole batch arrives, so time a chat spends
+# queued for a free thread counts against it like it would for a real client
+def run_sync(app):
+    test_client = app.test_client()
+
+    def one(i):
+        test_client.post("/chat", json={"session_id": f"sync{i}", "message": f"I had a long day ({i})"})
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        latencies = list(pool.map(one, range(CHATS)))
+    report(f"Flask /chat ({THREADS} threads)", latencies, time.perf_counter() - start)
+
+
+async def run_async(application):
+    async def one(i):
+        body = json.dumps({"session_id": f"async{i}", "message": f"I had a long day ({i})"}).encode()
+        scope = {"type": "http", "method": "POST", "path": "/chat", "headers": []}
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            pass
+
+        await application(scope, receive, send)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[one(i) for i in range(CHATS)])
+    report("ASGI /chat (event loop)", list(latencies), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    server = start_mock_ollama(ttft=LATENCY)
+    llama_client.client = llama_client.OllamaClient(server.url, pool_size=THREADS)
+    llama_client.async_client = llama_client.AsyncOllamaClient(server.url, pool_size=CHATS)
+
+    from app import app, BREAKER
+    from asgi import application
+
+    # Compare raw concurrency, not load shedding
+    BREAKER.max_pending = CHATS
+
+    run_sync(app)
+    asyncio.run(run_async(application))
+    server.shutdown()
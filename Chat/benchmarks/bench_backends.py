@@ -0,0 +1,40 @@
+# benchmarks/bench_backends.py
+# Least-loaded routing over several mock Ollama servers, with one taken down
+# and brought back mid-run to show ejection and readmission.
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llama_client import OllamaClient
+from ollama_backends import BackendPool
+from benchmarks.mock_ollama import start_mock_ollama
+
+THREADS = 12
+
+
+def burst(client, label, calls=120):
+    failed = 0
+
+    def one(i):
+        try:
+            client.generate(f"hi {i}", session_id=f"s{i % 30}")
+            return 0
+        except Exception:
+            return 1
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        failed = sum(pool.map(one, range(calls)))
+    print(f"{label:<22} failed={failed:<3}", " ".join(
+        f"{b['host'][-5:]}:{'up' if b['healthy'] else 'DOWN'}/{b['served']}" for b in client.backends.status()))
+
+
+if __name__ == "__main__":
+    servers = [start_mock_ollama(ttft=0.02) for _ in range(3)]
+    pool = BackendPool([s.url for s in servers], probe_interval=0.5)
+    client = OllamaClient(backends=pool, pool_size=THREADS)
+
+    burst(client, "all healthy")
+    servers[1].config["down"] = True
+    burst(client, "one backend down")
+    servers[1].config["down"] = False
+    time.sleep(1.2)
+    burst(client, "after readmission")
@@ -0,0 +1,35 @@
+# benchmarks/bench_client_pool.py
+# Per-call overhead of module-level requests.post vs the pooled OllamaClient.
+import sys, time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+from llama_client import OllamaClient, _payload
+from benchmarks.mock_ollama import start_mock_ollama
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+THREADS = 8
+
+
+def unpooled(url, i):
+    r = requests.post(f"{url}/api/generate", json=_payload(f"hi {i}", "llama3.2", False), timeout=120)
+    r.raise_for_status()
+    return r.json()["response"]
+
+
+def run(label, fn):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(fn, range(CALLS)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {CALLS} calls  {elapsed:.3f}s  {elapsed / CALLS * 1e6:.0f} us/call")
+
+
+if __name__ == "__main__":
+    server = start_mock_ollama()
+    # Distinct prompts, so nothing is merged: measure the connection cost only
+    client = OllamaClient(server.url, pool_size=THREADS)
+    run("requests.post", lambda i: unpooled(server.url, i))
+    run("OllamaClient (pooled)", lambda i: client.generate(f"hi {i}"))
+    client.close()
+    server.shutdown()
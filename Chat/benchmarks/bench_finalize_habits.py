@@ -0,0 +1,90 @@
+# benchmarks/bench_finalize_habits.py
+# Wall time of the habit day rollover over a seeded collection: the current
+# single pipeline update vs the old find() + update_one per habit (--legacy).
+# Uses mongomock unless --mongo points at a mongod; a scratch database is
+# created there and dropped afterwards.
+#
+#   python -m benchmarks.bench_finalize_habits 100000 --legacy
+#   python -m benchmarks.bench_finalize_habits 100000 1000000 --mongo mongodb://localhost:27017/
+import os, sys, time, argparse
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+import llama_client
+from benchmarks.mock_ollama import start_mock_ollama
+
+SCRATCH_DB = "bench_finalize_habits"
+BATCH = 10000
+
+
+def finalize_habits_per_document(habits_collection):
+    """The rollover as it used to be: one round trip per habit."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    for habit in habits_collection.find():
+        if habit.get("last_updated") != today:
+            streak = habit["streak"] + 1 if habit.get("temp_checked", False) else 0
+            habits_collection.update_one({"_id": habit["_id"]},
+                                         {"$set": {"temp_checked": False, "last_updated": today, "streak": streak}})
+
+
+def seed(collection, n):
+    collection.delete_many({})
+    yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    users = [ObjectId() for _ in range(max(1, n // 5))]
+    for start in range(0, n, BATCH):
+        collection.insert_many([
+            {"user_id": users[i % len(users)], "habit": f"Habit {i}", "streak": i % 30,
+             "temp_checked": i % 2 == 0, "last_updated": yesterday}
+            for i in range(start, min(n, start + BATCH))
+        ], ordered=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Habit rollover wall time at scale.")
+    parser.add_argument("sizes", nargs="*", type=int, default=[100000], help="habit counts to seed")
+    parser.add_argument("--mongo", help="mongod URI; default is an in-process mongomock")
+    parser.add_argument("--legacy", action="store_true", help="also time the old per-document loop")
+    args = parser.parse_args()
+
+    if args.mongo:
+        from pymongo import MongoClient
+        mongo = MongoClient(args.mongo)
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("Pass --mongo or install mongomock: pip install mongomock")
+        mongo = mongomock.MongoClient()
+    collection = mongo[SCRATCH_DB]["Habits"]
+
+    # Importing app starts the model warmer; give it something to talk to
+    server = start_mock_ollama()
+    llama_client.client = llama_client.OllamaClient(server.url)
+    # No index build against a local mongod in the middle of the run
+    os.environ["MONGO_INDEXES_ON_STARTUP"] = "0"
+    import app as chat_app
+    chat_app.habits_collection = collection
+
+    print(f"{'habits':>9} {'seed s':>8} {'pipeline s':>11} {'legacy s':>9}")
+    try:
+        for n in args.sizes:
+            start = time.perf_counter()
+            seed(collection, n)
+            seeded = time.perf_counter() - start
+
+            start = time.perf_counter()
+            modified = chat_app.finalize_habits()
+            pipeline = time.perf_counter() - start
+            assert modified == n, (modified, n)
+
+            legacy = "-"
+            if args.legacy:
+                seed(collection, n)
+                start = time.perf_counter()
+                finalize_habits_per_document(collection)
+                legacy = f"{time.perf_counter() - start:.2f}"
+            print(f"{n:>9} {seeded:>8.2f} {pipeline:>11.2f} {legacy:>9}")
+    finally:
+        mongo.drop_database(SCRATCH_DB)
+        server.shutdown()
@@ -0,0 +1,141 @@
+# benchmarks/bench_micro.py
+# Microbenchmarks of the pieces every request touches, printed as JSON so two
+# runs can be compared:
+#
+#   python -m benchmarks.bench_micro --out before.json
+#   python -m benchmarks.bench_micro --compare before.json
+import os, json, time, random, timeit, argparse, platform
+from datetime import datetime
+
+import bson
+from bson.objectid import ObjectId
+
+import llama_client
+from benchmarks.mock_ollama import start_mock_ollama
+from prompt_builder import build_history_prompt
+
+SIZES = [10, 100, 1000]
+WORDS = "i feel tired and anxious about exams my friends do not call me back lately".split()
+MESSAGES = [
+    "hi",
+    "I have been feeling really stressed about my exams and I can't sleep",
+    "my friends don't really talk to me anymore",
+    "I want to die",
+    "thanks, bye",
+]
+
+
+def measure(fn, repeat=5):
+    """Per-call microseconds: best and median of `repeat` rounds of an autoranged loop."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    rounds = sorted(t / number for t in timer.repeat(repeat, number))
+    return {"calls": number * repeat, "best_us": round(rounds[0] * 1e6, 3), "median_us": round(rounds[len(rounds) // 2] * 1e6, 3)}
+
+
+def history(rng, turns):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": " ".join(rng.choices(WORDS, k=rng.randint(5, 40))), "at": time.time()}
+        for i in range(turns)
+    ]
+
+
+def habit_docs(n):
+    user_id = ObjectId()
+    today = datetime.now().strftime("%Y-%m-%d")
+    return [{"_id": ObjectId(), "user_id": user_id, "habit": f"Habit {i}", "streak": i % 30,
+             "temp_checked": i % 2 == 0, "last_updated": today} for i in range(n)]
+
+
+def task_docs(n):
+    user_id = ObjectId()
+    today = datetime.now().strftime("%Y-%m-%d")
+    return [{"_id": ObjectId(), "user_id": user_id, "task": f"Task {i}", "time": "07:30", "duration": "30 min",
+             "completed": i % 3 == 0, "last_updated": today} for i in range(n)]
+
+
+def run(app_module):
+    from flask import render_template
+
+    rng = random.Random(7)
+    results = {}
+
+    for i, message in enumerate(MESSAGES):
+        results[f"match_pattern[{i}:{len(message)} chars]"] = measure(lambda: app_module.match_pattern(message))
+
+    # /chat used to join the last six messages into convo_text; the prompt is now
+    # built by build_history_prompt, so time both on the same history
+    for turns in (6, 50):
+        messages = history(rng, turns)
+        results[f"convo_text_join[{turns} msgs]"] = measure(lambda: "".join(
+            f"{msg['role'].capitalize()}: {msg['content']}\n" for msg in messages[-6:]))
+        results[f"build_history_prompt[{turns} msgs]"] = measure(
+            lambda: build_history_prompt(app_module.SYSTEM_PROMPT, messages, {"text": "earlier summary", "through": 0}))
+
+    bcrypt = app_module.bcrypt
+    hashed = bcrypt.generate_password_hash("correct horse battery").decode("utf-8")
+    results[f"bcrypt_check[{bcrypt._log_rounds} rounds]"] = measure(
+        lambda: bcrypt.check_password_hash(hashed, "correct horse battery"), repeat=3)
+
+    with app_module.app.test_request_context():
+        for n in SIZES:
+            today = datetime.now().date()
+            habits = [app_module.habit_stats(habit, today) for habit in habit_docs(n)]
+            tasks = task_docs(n)
+            results[f"render_habit_dashboard[{n}]"] = measure(
+                lambda: render_template("habit_dashboard.html", habits=habits))
+            results[f"render_routine_dashboard[{n}]"] = measure(
+                lambda: render_template("routine_dashboard.html", tasks=tasks, all_done=False))
+
+    user_id = str(ObjectId())
+    results["objectid_from_str"] = measure(lambda: ObjectId(user_id))
+    results["objectid_to_str"] = measure(lambda: str(ObjectId(user_id)))
+    habit = habit_docs(1)[0]
+    raw_habit = bson.encode(habit)
+    results["bson_encode[habit]"] = measure(lambda: bson.encode(habit))
+    results["bson_decode[habit]"] = measure(lambda: bson.decode(raw_habit))
+    conversation = {"session_id": user_id, "messages": history(rng, 50), "updated_at": datetime.utcnow()}
+    results["bson_encode[conversation 50 msgs]"] = measure(lambda: bson.encode(conversation))
+    for n in SIZES:
+        docs = habit_docs(n)
+        results[f"bson_encode[{n} habits]"] = measure(lambda: [bson.encode(doc) for doc in docs])
+
+    return results
+
+
+def compare(results, previous):
+    """Median ratio against an earlier run; above 1 means slower now."""
+    return {name: round(r["median_us"] / previous[name]["median_us"], 3)
+            for name, r in results.items() if previous.get(name, {}).get("median_us")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the per-request hot paths.")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="earlier JSON report to compare medians against")
+    args = parser.parse_args()
+
+    # Importing app starts the model warmer; give it something to talk to
+    server = start_mock_ollama()
+    llama_client.client = llama_client.OllamaClient(server.url)
+    # No index build against a local mongod in the middle of the run
+    os.environ["MONGO_INDEXES_ON_STARTUP"] = "0"
+    import app as app_module
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "at": datetime.utcnow().isoformat(timespec="seconds"),
+        "results": run(app_module)
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["ratio_vs_previous"] = compare(report["results"], json.load(f)["results"])
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    server.shutdown()
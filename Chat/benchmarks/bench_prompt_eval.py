@@ -0,0 +1,40 @@
+# benchmarks/bench_prompt_eval.py
+# Prompt-eval time at fixed context sizes, plus the cost of building the prompt.
+# Runs against OLLAMA_HOST; pass --mock to use the local stand-in instead.
+import sys, time, random
+
+import llama_client
+from prompt_builder import build_history_prompt, estimate_tokens
+from benchmarks.mock_ollama import start_mock_ollama
+
+SIZES = [256, 512, 1024, 2048]
+SYSTEM_PROMPT = "You are a compassionate, supportive mental health chatbot."
+WORDS = "i feel tired and anxious about exams my friends do not call me back lately".split()
+
+
+def history(rng, turns=200):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": " ".join(rng.choices(WORDS, k=rng.randint(5, 60)))}
+        for i in range(turns)
+    ]
+
+
+if __name__ == "__main__":
+    if "--mock" in sys.argv:
+        server = start_mock_ollama(prompt_rate=2000)
+        llama_client.client = llama_client.OllamaClient(server.url)
+
+    rng = random.Random(7)
+    messages = history(rng)
+    print(f"{'budget':>7} {'est tokens':>10} {'build us':>9} {'prompt_eval_count':>17} {'prompt_eval ms':>14}")
+    for size in SIZES:
+        estimate_tokens.cache_clear()
+        start = time.perf_counter()
+        prompt = build_history_prompt(SYSTEM_PROMPT, messages, budget=size)
+        build = (time.perf_counter() - start) * 1e6
+
+        meta = {}
+        llama_client.client.generate(prompt, meta=meta)
+        print(f"{size:>7} {estimate_tokens(prompt):>10} {build:>9.0f} "
+              f"{meta.get('prompt_eval_count', 0):>17} {meta.get('prompt_eval_duration', 0) / 1e6:>14.1f}")
@@ -0,0 +1,147 @@
+# benchmarks/load_test.py
+# End-to-end load test: the Flask app on a real threaded HTTP server, a mock
+# Ollama and an in-memory Mongo (mongomock), so it runs offline on one box.
+# Each virtual user replays journeys of register -> login -> chat x N ->
+# habits -> routine and the report gives req/s and latency per route.
+#
+#   python -m benchmarks.load_test --users 20 --journeys 100 --chats 5 --ttft 0.3 --token-rate 50
+import os, sys, time, json, logging, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import llama_client
+from benchmarks.mock_ollama import start_mock_ollama
+
+MESSAGES = [
+    "hi",
+    "I have been feeling really stressed about my exams",
+    "I can't sleep properly and I keep overthinking everything",
+    "my friends don't really talk to me anymore",
+    "how do I stay focused when studying for long hours?",
+    "thanks, that helps a bit",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end load test against a mock Ollama and mongomock.")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--journeys", type=int, default=100, help="journeys to run in total")
+    parser.add_argument("--chats", type=int, default=5, help="chat messages per journey")
+    parser.add_argument("--stream", action="store_true", help="chat over /chat/stream instead of /chat")
+    parser.add_argument("--ttft", type=float, default=0.3, help="mock Ollama seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=50, help="mock Ollama tokens per second (0 = instant)")
+    parser.add_argument("--tokens", type=int, default=30, help="tokens per mock reply")
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="override BCRYPT_LOG_ROUNDS")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+def start_app(args, ollama_url):
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("The load test needs mongomock for its in-process Mongo: pip install mongomock")
+    from werkzeug.serving import make_server
+
+    llama_client.client = llama_client.OllamaClient(ollama_url, pool_size=args.users)
+    llama_client.async_client = llama_client.AsyncOllamaClient(ollama_url, pool_size=args.users)
+
+    # Indexes go on the stand-in below, not on whatever mongod runs locally
+    os.environ["MONGO_INDEXES_ON_STARTUP"] = "0"
+    import app as chat_app
+    from db_indexes import ensure_indexes
+    db = mongomock.MongoClient()["Mental_Health_Assist"]
+    ensure_indexes(db)
+    chat_app.db = db
+    chat_app.users = db["Users"]
+    chat_app.schedules_collection = db["Scheduler"]
+    chat_app.habits_collection = db["Habits"]
+    chat_app.habit_logs = chat_app.HABIT_LOG.collection = db["HabitLogs"]
+    chat_app.routine_tasks = db["routine_tasks"]
+    if args.bcrypt_rounds:
+        chat_app.app.config["BCRYPT_LOG_ROUNDS"] = args.bcrypt_rounds
+        chat_app.bcrypt._log_rounds = args.bcrypt_rounds
+    # Measure the app under load, not load shedding
+    chat_app.BREAKER.max_pending = args.users
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log per request
+    server = make_server("127.0.0.1", 0, chat_app.app, threaded=True)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def request(self, http, route, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            r = http.request(method, url, allow_redirects=False, timeout=300, **kwargs)
+            r.content  # include reading the body (and the whole stream)
+            ok = r.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples.setdefault(route, []).append(elapsed)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, wall):
+        routes = {}
+        for route, samples in self.samples.items():
+            samples = sorted(samples)
+            pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+            routes[route] = {
+                "requests": len(samples), "errors": self.errors.get(route, 0),
+                "req_per_s": round(len(samples) / wall, 1),
+                "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)
+            }
+        total = sum(r["requests"] for r in routes.values())
+        return {"wall_s": round(wall, 2), "requests": total, "req_per_s": round(total / wall, 1), "routes": routes}
+
+
+def journey(recorder, base, i, args):
+    http = requests.Session()
+    form = {"username": f"load{i}", "password": f"pw-{i}-secret"}
+    recorder.request(http, "POST /register", "POST", f"{base}/register", data=form)
+    recorder.request(http, "POST /login", "POST", f"{base}/login", data=form)
+    path = "/chat/stream" if args.stream else "/chat"
+    for k in range(args.chats):
+        message = f"{MESSAGES[k % len(MESSAGES)]} ({i}.{k})"
+        recorder.request(http, f"POST {path}", "POST", f"{base}{path}", json={"message": message})
+    recorder.request(http, "GET /habits", "GET", f"{base}/habits")
+    recorder.request(http, "GET /routine", "GET", f"{base}/routine")
+    http.close()
+
+
+def print_report(result):
+    print(f"{'route':<20} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, r in result["routes"].items():
+        print(f"{route:<20} {r['requests']:>6} {r['errors']:>5} {r['req_per_s']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+    print(f"total {result['requests']} requests in {result['wall_s']}s, {result['req_per_s']} req/s")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    ollama = start_mock_ollama(ttft=args.ttft, token_rate=args.token_rate, tokens=args.tokens)
+    server, base = start_app(args, ollama.url)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.users) as pool:
+        list(pool.map(lambda i: journey(recorder, base, i, args), range(args.journeys)))
+    result = recorder.report(time.perf_counter() - start)
+    result["config"] = {k: v for k, v in vars(args).items() if k != "json"}
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    server.shutdown()
+    ollama.shutdown()
@@ -0,0 +1,99 @@
+# benchmarks/mock_ollama.py
+import json, time, socket, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for Ollama's /api/generate and /api/tags. Speaks HTTP/1.1
+    keep-alive so clients can reuse connections the same way they would
+    against Ollama. Set server.config["down"] to answer everything with 503.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Go's net/http (and so Ollama) disables Nagle; without this keep-alive
+        # responses stall on delayed ACKs and pooling looks slower than it is
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _write_chunk(self, body):
+        raw = json.dumps(body).encode() + b"\n"
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.server.config["down"]:
+            return self._send_json({"error": "unavailable"}, 503)
+        if self.path != "/api/tags":
+            return self._send_json({"error": "not found"}, 404)
+        self._send_json({"models": [{"name": "llama3.2:latest"}]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        cfg = self.server.config
+        self.server.calls += 1
+
+        if cfg["down"]:
+            return self._send_json({"error": "unavailable"}, 503)
+        if self.path != "/api/generate":
+            return self._send_json({"error": "not found"}, 404)
+
+        prompt_tokens = len(payload.get("prompt", "").split())
+        prefill = prompt_tokens / cfg["prompt_rate"] if cfg["prompt_rate"] else 0
+        time.sleep(cfg["ttft"] + prefill)
+        tokens = [f"tok{i} " for i in range(cfg["tokens"])]
+        context = payload.get("context", []) + list(range(prompt_tokens + len(tokens)))
+        generation = cfg["tokens"] / cfg["token_rate"] if cfg["token_rate"] else 0
+        done = {
+            "model": payload.get("model"), "done": True, "context": context,
+            "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prefill * 1e9),
+            "eval_count": len(tokens), "eval_duration": int(generation * 1e9)
+        }
+
+        if not payload.get("stream"):
+            time.sleep(generation)
+            return self._send_json(dict(done, response="".join(tokens)))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for tok in tokens:
+            if cfg["token_rate"]:
+                time.sleep(1 / cfg["token_rate"])
+            self._write_chunk({"model": payload.get("model"), "response": tok, "done": False})
+        self._write_chunk(dict(done, response=""))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default of 5 drops SYNs under concurrent load
+
+
+def start_mock_ollama(port=0, ttft=0.0, token_rate=0, tokens=5, prompt_rate=0):
+    """
+    Starts the mock server on a background thread and returns it.
+    ttft is seconds before the first token, token_rate is tokens per second
+    and prompt_rate is prompt words prefilled per second (0 means instant).
+    The base URL is server.url.
+    """
+    server = MockOllamaServer(("127.0.0.1", port), MockOllamaHandler)
+    server.config = {"ttft": ttft, "token_rate": token_rate, "tokens": tokens, "prompt_rate": prompt_rate, "down": False}
+    server.calls = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,87 @@
+# circuit_breaker.py
+import os, time, threading
+from collections import deque
+
+MAX_PENDING = int(os.environ.get("BREAKER_MAX_PENDING", "32"))
+ERROR_RATE = float(os.environ.get("BREAKER_ERROR_RATE", "0.5"))
+SLOW_SECONDS = float(os.environ.get("BREAKER_SLOW_SECONDS", "30"))
+COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "15"))
+
+
+class CircuitBreaker:
+    """
+    Guards the LLM call. admit() hands out a ticket, or None when the call
+    should be answered some other way right now: either the circuit is open
+    because too many recent calls failed or took longer than slow_seconds,
+    or max_pending calls are already admitted. Nothing waits in line, so an
+    overloaded Ollama turns into instant fallback replies instead of a pile
+    of blocked workers. After cooldown one trial call decides whether the
+    circuit closes again.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING, error_rate=ERROR_RATE, slow_seconds=SLOW_SECONDS,
+                 cooldown=COOLDOWN, window=20, min_calls=10):
+        self.max_pending = max_pending
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.min_calls = min_calls
+        self.outcomes = deque(maxlen=window)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.counters = {"admitted": 0, "rejected_open": 0, "rejected_full": 0, "opened": 0}
+
+    def admit(self):
+        """Returns a ticket to pass to done(), or None to shed the request."""
+        with self.lock:
+            ticket = "normal"
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.counters["rejected_open"] += 1
+                    return None
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self.trial_running:
+                    self.counters["rejected_open"] += 1
+                    return None
+                ticket = "trial"
+            if self.pending >= self.max_pending:
+                self.counters["rejected_full"] += 1
+                return None
+
+            if ticket == "trial":
+                self.trial_running = True
+            self.pending += 1
+            self.counters["admitted"] += 1
+            return ticket
+
+    def done(self, ticket, ok, seconds):
+        """Reports how an admitted call went; ok=None means the client went away."""
+        with self.lock:
+            self.pending -= 1
+            failed = ok is False or (ok and seconds > self.slow_seconds)
+            if ticket == "trial":
+                self.trial_running = False
+                if failed:
+                    self._open()
+                elif ok:
+                    self.state = "closed"
+                    self.outcomes.clear()
+            elif self.state == "closed" and ok is not None:
+                self.outcomes.append(failed)
+                if len(self.outcomes) >= self.min_calls and sum(self.outcomes) / len(self.outcomes) >= self.error_rate:
+                    self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self.counters["opened"] += 1
+        print("Circuit opened for Ollama calls")
+
+    def status(self):
+        with self.lock:
+            return dict(self.counters, state=self.state, pending=self.pending)
@@ -0,0 +1,297 @@
+# conversation_store.py
+import os, time, uuid, atexit, threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from pymongo import UpdateOne
+
+MAX_MESSAGES = int(os.environ.get("CONVO_MAX_MESSAGES", "50"))
+TTL = int(os.environ.get("CONVO_TTL", "3600"))  # seconds a session may sit idle
+MAX_BYTES = int(os.environ.get("CONVO_MAX_BYTES", str(64 * 1024 * 1024)))
+
+BACKEND = os.environ.get("CONVO_BACKEND", "memory")  # "memory" or "mongo"
+
+MESSAGE_OVERHEAD = 64  # rough size of the dict around each message
+TOKEN_SIZE = 8  # one list slot per Ollama context token
+
+
+class ConversationStore:
+    """
+    In-memory chat history per session, bounded three ways: at most
+    max_messages per session, sessions idle longer than ttl are dropped, and
+    the whole store stays under max_bytes by evicting the least recently
+    used sessions. Sizes are estimates from message length, not exact RSS.
+    Also keeps each session's Ollama context tokens and rolling summary so
+    they expire with it.
+    """
+
+    def __init__(self, max_messages=MAX_MESSAGES, ttl=TTL, max_bytes=MAX_BYTES):
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "trimmed": 0}
+
+    def _entry(self, session_id, create=False):
+        now = time.monotonic()
+        entry = self.sessions.get(session_id)
+        if entry and now - entry["seen"] > self.ttl:
+            self._drop(session_id, "expired")
+            entry = None
+
+        if entry:
+            self.counters["hits"] += 1
+            self.sessions.move_to_end(session_id)
+        else:
+            self.counters["misses"] += 1
+            if not create:
+                return None
+            entry = self.sessions[session_id] = {"messages": deque(), "context": None, "summary": None, "size": 0}
+        entry["seen"] = now
+        return entry
+
+    def _drop(self, session_id, reason):
+        entry = self.sessions.pop(session_id)
+        self.size -= entry["size"]
+        self.counters[reason] += 1
+
+    def _resize(self, entry, delta):
+        entry["size"] += delta
+        self.size += delta
+
+    def _enforce(self):
+        # Least recently used sessions sit at the front
+        now = time.monotonic()
+        while self.sessions:
+            session_id, entry = next(iter(self.sessions.items()))
+            if now - entry["seen"] > self.ttl:
+                self._drop(session_id, "expired")
+            elif self.size > self.max_bytes and len(self.sessions) > 1:
+                self._drop(session_id, "evicted")
+            else:
+                break
+
+    def append(self, session_id, role, content):
+        with self.lock:
+            entry = self._entry(session_id, create=True)
+            entry["messages"].append({"role": role, "content": content, "at": time.time()})
+            self._resize(entry, len(content) + MESSAGE_OVERHEAD)
+            while len(entry["messages"]) > self.max_messages:
+                old = entry["messages"].popleft()
+                self._resize(entry, -(len(old["content"]) + MESSAGE_OVERHEAD))
+                self.counters["trimmed"] += 1
+            self._enforce()
+
+    def messages(self, session_id, last=None):
+        with self.lock:
+            entry = self._entry(session_id)
+            if not entry:
+                return []
+            msgs = list(entry["messages"])
+        return msgs[-last:] if last else msgs
+
+    def get_context(self, session_id):
+        with self.lock:
+            entry = self._entry(session_id)
+            return entry["context"] if entry else None
+
+    def set_context(self, session_id, model, tokens):
+        """Stores the context tokens `model` returned; pass tokens=None to forget them."""
+        with self.lock:
+            entry = self._entry(session_id, create=True)
+            old = entry["context"]["tokens"] if entry["context"] else ()
+            self._resize(entry, TOKEN_SIZE * (len(tokens or ()) - len(old)))
+            entry["context"] = {"model": model, "tokens": tokens} if tokens else None
+            self._enforce()
+
+    def get_summary(self, session_id):
+        with self.lock:
+            entry = self._entry(session_id)
+            return entry["summary"] if entry else None
+
+    def set_summary(self, session_id, text, through):
+        """Stores the summary of every message up to the `through` timestamp."""
+        with self.lock:
+            entry = self._entry(session_id, create=True)
+            old = entry["summary"]["text"] if entry["summary"] else ""
+            self._resize(entry, len(text) - len(old))
+            entry["summary"] = {"text": text, "through": through}
+            self._enforce()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, sessions=len(self.sessions), bytes=self.size)
+
+
+class MongoConversationStore:
+    """
+    Chat history shared by every worker process, one document per session in
+    a Mongo collection with the message list capped by $slice. Appends are
+    buffered and written by a background thread in one unordered bulk_write,
+    so a chat turn does not wait on a Mongo round trip. Reads go through a
+    small LRU cache whose entries live cache_ttl seconds, which bounds how
+    stale a process can be after another process served the same session.
+    Each flush is numbered and also records that number in the session
+    documents it writes, so a read that races a flush can tell whether the
+    batch already landed and must not be merged in a second time.
+    """
+
+    def __init__(self, collection, max_messages=MAX_MESSAGES, ttl=TTL,
+                 cache_size=1000, cache_ttl=2.0, flush_interval=0.2, batch_size=500):
+        self.collection = collection
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.pending_count = 0
+        self.flushing = {}
+        self.writer = uuid.uuid4().hex  # keys this store's flush numbers in each document
+        self.generation = 0  # number of the latest flush started
+        self.landed = 0  # number of the latest flush written
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.counters = {"hits": 0, "misses": 0, "flushes": 0, "written": 0, "errors": 0}
+
+        threading.Thread(target=self._flush_loop, name="conversation-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _cached(self, session_id):
+        entry = self.cache.get(session_id)
+        if entry and time.monotonic() - entry["loaded"] <= self.cache_ttl:
+            self.counters["hits"] += 1
+            self.cache.move_to_end(session_id)
+            return entry
+        self.counters["misses"] += 1
+        return None
+
+    def _load(self, session_id):
+        with self.lock:
+            entry = self._cached(session_id)
+            landed = self.landed
+        if entry:
+            return entry
+
+        projection = {"_id": 0, "messages": 1, "context": 1, "summary": 1, f"flushed.{self.writer}": 1}
+        while True:
+            doc = self.collection.find_one({"session_id": session_id}, projection) or {}
+            with self.lock:
+                if self.landed != landed:
+                    # A flush finished during the read, which may or may not have seen it
+                    landed = self.landed
+                    continue
+                # Writes this process has not flushed yet are not in Mongo; the
+                # batch in flight may be, if bulk_write got there before the read
+                unflushed = [self.pending.get(session_id, {})]
+                if doc.get("flushed", {}).get(self.writer, 0) < self.generation:
+                    unflushed.insert(0, self.flushing.get(session_id, {}))
+                entry = {"messages": doc.get("messages", []), "context": doc.get("context"), "summary": doc.get("summary")}
+                for queued in unflushed:
+                    entry["messages"] = entry["messages"] + queued.get("messages", [])
+                    entry.update(queued.get("fields", {}))
+                entry["messages"] = entry["messages"][-self.max_messages:]
+                entry["loaded"] = time.monotonic()
+                self.cache[session_id] = entry
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+                return entry
+
+    def _queue(self, session_id, message=None, fields=None):
+        with self.lock:
+            queued = self.pending.setdefault(session_id, {})
+            if message:
+                queued.setdefault("messages", []).append(message)
+            if fields:
+                queued.setdefault("fields", {}).update(fields)
+            self.pending_count += 1
+            entry = self.cache.get(session_id)
+            if entry:
+                if message:
+                    entry["messages"] = (entry["messages"] + [message])[-self.max_messages:]
+                entry.update(fields or {})
+            full = self.pending_count >= self.batch_size
+        if full:
+            self.wake.set()
+
+    def append(self, session_id, role, content):
+        self._load(session_id)
+        self._queue(session_id, message={"role": role, "content": content, "at": time.time()})
+
+    def messages(self, session_id, last=None):
+        msgs = self._load(session_id)["messages"]
+        return msgs[-last:] if last else list(msgs)
+
+    def get_context(self, session_id):
+        return self._load(session_id)["context"]
+
+    def set_context(self, session_id, model, tokens):
+        """Stores the context tokens `model` returned; pass tokens=None to forget them."""
+        self._queue(session_id, fields={"context": {"model": model, "tokens": tokens} if tokens else None})
+
+    def get_summary(self, session_id):
+        return self._load(session_id)["summary"]
+
+    def set_summary(self, session_id, text, through):
+        """Stores the summary of every message up to the `through` timestamp."""
+        self._queue(session_id, fields={"summary": {"text": text, "through": through}})
+
+    def flush(self):
+        with self.lock:
+            if self.flushing or not self.pending:
+                return  # nothing queued, or another thread is writing and the next tick picks this up
+            batch, self.pending, self.pending_count = self.pending, {}, 0
+            self.flushing = batch
+            self.generation += 1
+            generation = self.generation
+
+        now = datetime.utcnow()
+        ops = []
+        for session_id, queued in batch.items():
+            update = {"$set": dict(queued.get("fields", {}), updated_at=now, **{f"flushed.{self.writer}": generation})}
+            if queued.get("messages"):
+                update["$push"] = {"messages": {"$each": queued["messages"], "$slice": -self.max_messages}}
+            ops.append(UpdateOne({"session_id": session_id}, update, upsert=True))
+
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+            with self.lock:
+                self.flushing = {}
+                self.landed = generation
+                self.counters["flushes"] += 1
+                self.counters["written"] += len(ops)
+        except Exception as e:
+            print("ERROR: flushing conversations:", e)
+            self._requeue(batch)
+
+    def _requeue(self, batch):
+        # Put a failed batch back in front of anything queued since
+        with self.lock:
+            self.flushing = {}
+            self.counters["errors"] += 1
+            for session_id, queued in batch.items():
+                newer = self.pending.get(session_id, {})
+                self.pending[session_id] = {
+                    # Only the newest max_messages survive the $slice anyway; keeps an outage bounded
+                    "messages": (queued.get("messages", []) + newer.get("messages", []))[-self.max_messages:],
+                    "fields": dict(queued.get("fields", {}), **newer.get("fields", {}))
+                }
+                self.pending_count += 1
+
+    def _flush_loop(self):
+        try:
+            self.collection.create_index("session_id", unique=True)
+            self.collection.create_index("updated_at", expireAfterSeconds=self.ttl)
+        except Exception as e:
+            print("ERROR: creating conversation indexes:", e)
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, cached=len(self.cache), pending=self.pending_count)
@@ -0,0 +1,170 @@
+# db_indexes.py
+# Indexes the app's queries rely on. Applied in the background when app.py
+# starts (MONGO_INDEXES_ON_STARTUP=0 turns that off), or from the Chat folder:
+#
+#   python db_indexes.py                    create any missing indexes
+#   python db_indexes.py --check            explain() the hot queries, exit 1 on a COLLSCAN
+#   python db_indexes.py --check --scratch  the same on a seeded scratch database, dropped after
+import os, sys, time, threading
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import PyMongoError
+
+MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
+DB_NAME = "Mental_Health_Assist"
+SCRATCH_DB = "Mental_Health_Assist_index_check"
+ON_STARTUP = os.environ.get("MONGO_INDEXES_ON_STARTUP", "1") == "1"
+
+# (collection, keys, options). A (user_id, ...) compound index also serves
+# queries on user_id alone, so there is no separate user_id index.
+INDEXES = [
+    ("Users", [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ("Habits", [("user_id", ASCENDING), ("last_updated", ASCENDING)], {"name": "user_id_last_updated"}),
+    ("routine_tasks", [("user_id", ASCENDING), ("last_updated", ASCENDING)], {"name": "user_id_last_updated"}),
+    ("HabitLogs", [("habit_id", ASCENDING), ("year", ASCENDING)], {"name": "habit_id_year_unique", "unique": True}),
+    # _id last so the dashboard's keyset sort is read straight off the index
+    ("Scheduler", [("user_id", ASCENDING), ("date", ASCENDING), ("time", ASCENDING), ("_id", ASCENDING)],
+     {"name": "user_id_date_time"}),
+]
+
+
+def hot_queries(db):
+    """(label, cursor) for the queries every page load runs."""
+    user_id, habit_id = ObjectId(), ObjectId()
+    today = datetime.now().strftime("%Y-%m-%d")
+    return [
+        ("login / register", db["Users"].find({"username": "someone"}).limit(1)),
+        ("habit dashboard", db["Habits"].find({"user_id": user_id})),
+        ("habit rollover", db["Habits"].find({"user_id": user_id, "last_updated": {"$lt": today}})),
+        ("routine dashboard", db["routine_tasks"].find({"user_id": user_id})),
+        ("routine rollover", db["routine_tasks"].find({"user_id": user_id, "last_updated": {"$lt": today}})),
+        ("habit check-in", db["HabitLogs"].find({"habit_id": habit_id, "year": 2025}).limit(1)),
+        ("habit heatmap", db["HabitLogs"].find({"habit_id": habit_id, "user_id": user_id, "year": 2025}).limit(1)),
+        ("scheduler page", db["Scheduler"].find({"user_id": user_id, "$or": [
+            {"date": {"$gt": today}}, {"date": today, "time": {"$gt": "09:00"}},
+            {"date": today, "time": "09:00", "_id": {"$gt": ObjectId()}}
+        ]}).sort([("date", 1), ("time", 1), ("_id", 1)]).limit(21)),
+    ]
+
+
+def _build_progress(db, collection):
+    # Only visible to users allowed to run $currentOp; progress is best effort
+    try:
+        ops = db.client.admin.aggregate([
+            {"$currentOp": {"allUsers": True}},
+            {"$match": {"command.createIndexes": collection}}
+        ])
+        for op in ops:
+            if op.get("progress"):
+                return f"{op['progress'].get('done')}/{op['progress'].get('total')}"
+            if op.get("msg"):
+                return op["msg"]
+    except PyMongoError:
+        pass
+    return None
+
+
+def ensure_indexes(db, poll_interval=2.0):
+    """Creates every index in INDEXES that is missing; existing ones are left alone."""
+    ok = True
+    for collection, keys, options in INDEXES:
+        name = options["name"]
+        try:
+            if name in db[collection].index_information():
+                continue
+        except PyMongoError as e:
+            print("ERROR: reading indexes of", collection, e)
+            return False
+
+        print(f"Building index {name} on {collection}")
+        start = time.monotonic()
+        outcome = {}
+
+        def build():
+            try:
+                db[collection].create_index(keys, **options)
+            except PyMongoError as e:
+                outcome["error"] = e
+
+        builder = threading.Thread(target=build, name=f"index-{collection}", daemon=True)
+        builder.start()
+        while True:
+            builder.join(poll_interval)
+            if not builder.is_alive():
+                break
+            progress = _build_progress(db, collection)
+            print(f"  {name}: {progress or 'building'} ({time.monotonic() - start:.0f}s)")
+
+        if "error" in outcome:
+            # e.g. duplicate usernames already stored block the unique index
+            print(f"ERROR: building index {name} on {collection}:", outcome["error"])
+            ok = False
+        else:
+            print(f"Built index {name} on {collection} in {time.monotonic() - start:.1f}s")
+    return ok
+
+
+def ensure_indexes_in_background(db):
+    threading.Thread(target=ensure_indexes, args=(db,), name="index-builder", daemon=True).start()
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+def check_plans(db):
+    """
+    explain() every hot query; returns the labels of those that scan a whole
+    collection. A plan that is only EOF (the collection does not exist)
+    proves nothing, so it is returned as well.
+    """
+    scans = []
+    for label, cursor in hot_queries(db):
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        stages = list(_stages(plan))
+        print(f"{label:<20} {' <- '.join(stages)}")
+        if "COLLSCAN" in stages or stages == ["EOF"]:
+            scans.append(label)
+    return scans
+
+
+def seed_scratch(db):
+    """One document per collection plus the indexes, so every hot query has something to plan against."""
+    user_id, habit_id = ObjectId(), ObjectId()
+    today = datetime.now().strftime("%Y-%m-%d")
+    db["Users"].insert_one({"username": "someone", "password": "x"})
+    db["Habits"].insert_one({"_id": habit_id, "user_id": user_id, "habit": "h", "last_updated": today})
+    db["routine_tasks"].insert_one({"user_id": user_id, "task": "t", "last_updated": today})
+    db["HabitLogs"].insert_one({"habit_id": habit_id, "user_id": user_id, "year": 2025, "days": b"", "checked": 0})
+    db["Scheduler"].insert_one({"user_id": user_id, "date": today, "time": "09:00", "task": "s"})
+    return ensure_indexes(db)
+
+
+if __name__ == "__main__":
+    mongo = MongoClient(MONGO_URI)
+    db = mongo[DB_NAME]
+    if "--check" in sys.argv:
+        if "--scratch" in sys.argv:
+            db = mongo[SCRATCH_DB]
+            mongo.drop_database(SCRATCH_DB)
+        try:
+            if "--scratch" in sys.argv and not seed_scratch(db):
+                sys.exit(1)
+            scans = check_plans(db)
+        finally:
+            if "--scratch" in sys.argv:
+                mongo.drop_database(SCRATCH_DB)
+        if scans:
+            print("COLLSCAN or no collection in:", ", ".join(scans))
+            sys.exit(1)
+        print("No hot query scans a whole collection")
+    elif not ensure_indexes(db):
+        sys.exit(1)
@@ -0,0 +1,97 @@
+# habit_log.py
+from datetime import date, datetime
+from bson.binary import Binary
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+YEAR_BYTES = 46  # 366 bits, one per day of the year
+
+
+def day_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def is_set(days, index):
+    return bool(days[index >> 3] & (1 << (index & 7)))
+
+
+def days_in_year(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+class HabitLog:
+    """
+    Per-day check-ins, one HabitLogs document per habit and year:
+    {habit_id, user_id, year, days, checked}, where days is a 46 byte BSON
+    binary with bit n set when the habit was done on day n of the year and
+    checked counts the set bits. A year of history is one small document,
+    so a heatmap is a single read. Bits are flipped with a compare-and-set
+    on the previous bytes, so concurrent check-ins never overwrite each other.
+    The first insert makes sure the unique (habit_id, year) index exists,
+    since two first check-ins of a year can only be told apart by it.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.indexed = False
+
+    def _ensure_index(self):
+        # Same spec and name as in db_indexes.py, so either may create it
+        if not self.indexed:
+            self.collection.create_index([("habit_id", ASCENDING), ("year", ASCENDING)],
+                                         name="habit_id_year_unique", unique=True)
+            self.indexed = True
+
+    def set_day(self, habit_id, user_id, day, done):
+        """Marks `day` done or not done; returns True if that changed anything."""
+        index = day_index(day)
+        mask = 1 << (index & 7)
+        while True:
+            log = self.collection.find_one({"habit_id": habit_id, "year": day.year})
+            days = bytearray(log["days"]) if log else bytearray(YEAR_BYTES)
+            if is_set(days, index) == done:
+                return False
+            if done:
+                days[index >> 3] |= mask
+            else:
+                days[index >> 3] &= ~mask
+
+            if log is None:
+                self._ensure_index()
+                try:
+                    self.collection.insert_one({"habit_id": habit_id, "user_id": user_id, "year": day.year,
+                                                "days": Binary(bytes(days)), "checked": 1})
+                    return True
+                except DuplicateKeyError:
+                    continue  # someone else created this year's log first
+            result = self.collection.update_one(
+                {"_id": log["_id"], "days": log["days"]},
+                {"$set": {"days": Binary(bytes(days))}, "$inc": {"checked": 1 if done else -1}}
+            )
+            if result.modified_count:
+                return True
+
+    def heatmap(self, habit_id, user_id, year, today=None):
+        """A year of check-ins for the habit's owner, from one document read."""
+        today = today or datetime.now().date()
+        log = self.collection.find_one({"habit_id": habit_id, "user_id": user_id, "year": year},
+                                       {"_id": 0, "days": 1, "checked": 1})
+        days = bytes(log["days"]) if log else bytes(YEAR_BYTES)
+        length = days_in_year(year)
+
+        # Completion counts only the days the habit existed and have begun
+        first = max(date(year, 1, 1), habit_id.generation_time.date())
+        last = min(date(year, 12, 31), today)
+        tracked = (last - first).days + 1 if last >= first else 0
+        checked = log["checked"] if log else 0
+        return {
+            "habit_id": str(habit_id),
+            "year": year,
+            "start": date(year, 1, 1).isoformat(),
+            "days": [int(is_set(days, i)) for i in range(length)],
+            "checked": checked,
+            "completion_rate": round(checked / tracked, 3) if tracked else 0.0
+        }
+
+    def delete(self, habit_id, user_id):
+        self.collection.delete_many({"habit_id": habit_id, "user_id": user_id})
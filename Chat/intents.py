@@ -0,0 +1,142 @@
+# intents.py
+import os, json, time, threading
+from collections import deque, namedtuple
+from datetime import datetime
+
+
+class IntentMatcher:
+    """
+    Aho-Corasick automaton over every pattern in mental_responses.json.
+    Built once, then each message is scanned in a single pass no matter
+    how many patterns there are. When several tags match, the one with the
+    highest "priority" wins (ties go to file order), so "suicidal" always
+    beats "greeting".
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.rank = {tag: (-item.get("priority", 0), i) for i, (tag, item) in enumerate(responses.items())}
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+        for tag, item in responses.items():
+            for pat in item["patterns"]:
+                self._add(pat.lower(), tag)
+        self._link()
+
+    def _add(self, pattern, tag):
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append((tag, pattern))
+
+    def _link(self):
+        # Breadth-first so every fail target is finished before it is used
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def scan(self, text):
+        """Returns every (tag, pattern) found in text, in the order they end."""
+        goto, fail, out = self.goto, self.fail, self.out
+        hits = []
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.extend(out[node])
+        return hits
+
+    def match_all(self, text):
+        """Returns every matching tag, highest priority first."""
+        return sorted({tag for tag, _ in self.scan(text)}, key=self.rank.__getitem__)
+
+    def match(self, text):
+        """Returns (tag, responses) for the highest priority match, or (None, None)."""
+        hits = self.scan(text)
+        if not hits:
+            return None, None
+        tag = min((t for t, _ in hits), key=self.rank.__getitem__)
+        return tag, self.responses[tag]["responses"]
+
+
+IndexSnapshot = namedtuple("IndexSnapshot", "matcher version built_at mtime")
+
+
+class IntentIndex:
+    """
+    Holds the compiled IntentMatcher for a responses file and rebuilds it
+    when the file changes. A rebuild happens on the watcher thread and is
+    published by replacing one attribute, so a request always sees either
+    the old or the new index in full, without taking a lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = None
+        self.reload()
+
+    def reload(self):
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+        version = self.snapshot.version + 1 if self.snapshot else 1
+        self.snapshot = IndexSnapshot(IntentMatcher(responses), version, time.time(), mtime)
+
+    def watch(self, interval=2.0):
+        """Starts a daemon thread that polls the file's mtime."""
+        def loop():
+            failed = None
+            while True:
+                time.sleep(interval)
+                mtime = None
+                try:
+                    mtime = os.path.getmtime(self.path)
+                    if mtime in (self.snapshot.mtime, failed):
+                        continue
+                    self.reload()
+                    print("Reloaded intents, version", self.snapshot.version)
+                except Exception as e:
+                    # Keep serving the last good index, e.g. while the file is half written
+                    failed = mtime
+                    print("ERROR: reloading intents:", e)
+
+        threading.Thread(target=loop, name="intent-watcher", daemon=True).start()
+
+    @property
+    def responses(self):
+        return self.snapshot.matcher.responses
+
+    def match(self, text):
+        return self.snapshot.matcher.match(text)
+
+    def match_all(self, text):
+        return self.snapshot.matcher.match_all(text)
+
+    def status(self):
+        snap = self.snapshot
+        return {
+            "version": snap.version,
+            "built_at": datetime.fromtimestamp(snap.built_at).isoformat(timespec="seconds"),
+            "tags": len(snap.matcher.responses),
+            "patterns": sum(len(item["patterns"]) for item in snap.matcher.responses.values())
+        }
@@ -1,21 +1,373 @@
 # llama_client.py
+import os, json, time, asyncio, hashlib, threading
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from ollama_backends import BackendPool
 
 OLLAMA_HOST = "http://localhost:11434"
+# Comma separated list of Ollama servers to spread chats over
+OLLAMA_HOSTS = os.environ.get("OLLAMA_HOSTS", OLLAMA_HOST).split(",")
+MODEL = "llama3.2"
+OPTIONS = {"temperature": 0.7, "num_predict": 200, "num_ctx": 2048}
+# How long Ollama keeps a model loaded after the last request that used it
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
 
-def call_ollama(prompt, model="llama3.2"):
-    """
-    Calls local Ollama server with given prompt.
-    Make sure 'ollama run llama3.2' works first.
-    """
-    url = f"{OLLAMA_HOST}/api/generate"
+# Keep-alive connections per Ollama host; match it to the worker thread count
+POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "8"))
+# Extra seconds a generate call holds back so identical calls can join it;
+# 0 still merges every identical call that arrives while one is in flight
+COALESCE_WINDOW = float(os.environ.get("OLLAMA_COALESCE_WINDOW", "0"))
+
+
+def _payload(prompt, model, stream, context=None, options=None):
     payload = {
         "model": model,
         "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": 0.7, "num_predict": 200}
+        "stream": stream,
+        "keep_alive": KEEP_ALIVE,
+        "options": dict(OPTIONS, **options) if options else OPTIONS
     }
-    r = requests.post(url, json=payload, timeout=120)
-    r.raise_for_status()
-    data = r.json()
-    return data.get("response", "").strip()
+    if context:
+        payload["context"] = context
+    return payload
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical generate calls into one Ollama request.
+    Identical calls that arrive while the first one is in flight join it
+    and get the same result (or the same error). A non-zero `window` makes
+    the first caller hold back that many seconds before sending. Both do()
+    and ado() return (result, joined), joined being True for the callers
+    that shared another's request. Use one instance per client: do() and
+    ado() keep different kinds of waiters.
+    """
+
+    def __init__(self, window=COALESCE_WINDOW):
+        self.window = window
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "deduplicated": 0}
+
+    @staticmethod
+    def key(payload):
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _join(self, key, new_call):
+        with self.lock:
+            self.counters["requests"] += 1
+            call = self.calls.get(key)
+            if call is not None:
+                self.counters["deduplicated"] += 1
+                return call, False
+            call = self.calls[key] = new_call()
+            return call, True
+
+    def _leave(self, key):
+        with self.lock:
+            del self.calls[key]
+
+    def do(self, payload, fn):
+        key = self.key(payload)
+        call, leader = self._join(key, lambda: {"done": threading.Event()})
+        if not leader:
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["result"], True
+
+        try:
+            if self.window:
+                time.sleep(self.window)
+            call["result"] = fn()
+            return call["result"], False
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            self._leave(key)
+            call["done"].set()
+
+    async def ado(self, payload, fn):
+        key = self.key(payload)
+        future, leader = self._join(key, lambda: asyncio.get_running_loop().create_future())
+        if not leader:
+            return await asyncio.shield(future), True
+
+        # Nobody may be waiting on it; don't let an unread error get logged
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            if self.window:
+                await asyncio.sleep(self.window)
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._leave(key)
+
+    def status(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+class OllamaClient:
+    """
+    Long-lived Ollama client that reuses TCP connections between calls.
+    One instance is shared by all worker threads: urllib3 hands each thread
+    its own connection from the pool, and with pool_block a thread waits for
+    a free connection instead of opening one that would be thrown away.
+    Calls are spread over `hosts` by a BackendPool, and identical generate
+    calls in flight at the same time are sent once.
+    """
+
+    def __init__(self, hosts=OLLAMA_HOSTS, pool_size=POOL_SIZE, timeout=120, backends=None, flights=None):
+        self.backends = backends or BackendPool([hosts] if isinstance(hosts, str) else hosts)
+        self.flights = flights or SingleFlight()
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends.backends), pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate(self, prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+        """
+        Returns the reply text. Pass the `context` tokens from an earlier
+        reply to continue that conversation; if `meta` is a dict it is filled
+        with the rest of Ollama's response (context, timings, counts), plus
+        deduplicated=True if this call shared an identical one's request.
+        `options` overrides entries of OPTIONS for this call only, and
+        `session_id` keeps a conversation on the backend that served it.
+        """
+        payload = _payload(prompt, model, False, context, options)
+
+        def send():
+            with self.backends.lease(session_id) as backend:
+                r = self.session.post(f"{backend.host}/api/generate", json=payload, timeout=self.timeout)
+                r.raise_for_status()
+                return r.json()
+
+        data, joined = self.flights.do(payload, send)
+        if meta is not None:
+            meta.update(data, deduplicated=joined)
+        return data.get("response", "").strip()
+
+    def stream(self, prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+        with self.backends.lease(session_id) as backend, self.session.post(
+            f"{backend.host}/api/generate", json=_payload(prompt, model, True, context, options),
+            stream=True, timeout=self.timeout
+        ) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    if meta is not None:
+                        meta.update(chunk)
+                    break
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOllamaClient:
+    """
+    asyncio counterpart of OllamaClient on plain asyncio streams, so pending
+    generations wait on the event loop instead of each holding a thread.
+    Idle keep-alive connections are kept for reuse, at most pool_size open.
+    Speaks just enough HTTP/1.1 for Ollama (Content-Length and chunked bodies).
+    Like requests' timeout, `timeout` bounds the connect and every single
+    read, so a stalled backend gives up its slot instead of holding it.
+    """
+
+    def __init__(self, hosts=OLLAMA_HOSTS, pool_size=64, timeout=120, backends=None, flights=None):
+        self.backends = backends or BackendPool([hosts] if isinstance(hosts, str) else hosts)
+        self.flights = flights or SingleFlight()
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._loop = None
+
+    def _bind(self):
+        # Connections and the semaphore belong to one event loop
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = {}
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+    async def _open(self, host):
+        if self._idle.get(host):
+            return self._idle[host].pop()
+        url = urlsplit(host)
+        return await self._io(asyncio.open_connection(url.hostname, url.port or 80))
+
+    def _io(self, awaitable):
+        return asyncio.wait_for(awaitable, self.timeout)
+
+    async def _post(self, host, path, payload):
+        body = json.dumps(payload).encode()
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {urlsplit(host).netloc}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        )
+        while True:
+            pooled = bool(self._idle.get(host))
+            reader, writer = await self._open(host)
+            try:
+                writer.write(head.encode() + body)
+                await self._io(writer.drain())
+                status_line = await self._io(reader.readline())
+                if not status_line:
+                    raise ConnectionResetError("Ollama closed the connection")
+                status = int(status_line.split()[1])
+                headers = {}
+                while True:
+                    line = await self._io(reader.readline())
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                return reader, writer, status, headers
+            except ConnectionError:
+                writer.close()
+                # A pooled keep-alive connection may have gone stale; retry on a fresh one
+                if not pooled:
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+
+    async def _lines(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            buffer = b""
+            while True:
+                size = int((await self._io(reader.readline())).split(b";")[0], 16)
+                if size == 0:
+                    await self._io(reader.readline())
+                    break
+                buffer += await self._io(reader.readexactly(size))
+                await self._io(reader.readexactly(2))
+                *complete, buffer = buffer.split(b"\n")
+                for line in complete:
+                    yield line
+            if buffer:
+                yield buffer
+        else:
+            body = await self._io(reader.readexactly(int(headers.get("content-length", 0))))
+            for line in body.split(b"\n"):
+                yield line
+
+    def _release(self, host, reader, writer, headers, reusable):
+        if reusable and headers.get("connection", "").lower() != "close":
+            self._idle.setdefault(host, []).append((reader, writer))
+        else:
+            writer.close()
+
+    async def generate(self, prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+        self._bind()
+        payload = _payload(prompt, model, False, context, options)
+
+        async def send():
+            async with self._slots:
+                with self.backends.lease(session_id) as backend:
+                    return await asyncio.wait_for(self._generate(backend.host, payload), self.timeout)
+
+        data, joined = await self.flights.ado(payload, send)
+        if meta is not None:
+            meta.update(data, deduplicated=joined)
+        return data.get("response", "").strip()
+
+    async def _generate(self, host, payload):
+        reader, writer, status, headers = await self._post(host, "/api/generate", payload)
+        reusable = False
+        try:
+            body = b"".join([line async for line in self._lines(reader, headers)])
+            reusable = True
+        finally:
+            self._release(host, reader, writer, headers, reusable)
+        if status >= 400:
+            raise RuntimeError(f"Ollama returned HTTP {status}: {body[:200]!r}")
+        return json.loads(body)
+
+    async def stream(self, prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+        self._bind()
+        async with self._slots:
+            with self.backends.lease(session_id) as backend:
+                async for token in self._stream(backend.host, prompt, model, context, meta, options):
+                    yield token
+
+    async def _stream(self, host, prompt, model, context, meta, options):
+        reader, writer, status, headers = await self._post(host, "/api/generate", _payload(prompt, model, True, context, options))
+        if status >= 400:
+            writer.close()
+            raise RuntimeError(f"Ollama returned HTTP {status}")
+        reusable = False
+        try:
+            async for line in self._lines(reader, headers):
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done") and meta is not None:
+                    meta.update(chunk)
+            reusable = True
+        finally:
+            self._release(host, reader, writer, headers, reusable)
+
+    async def close(self):
+        for conns in (self._idle.values() if self._loop else ()):
+            while conns:
+                conns.pop()[1].close()
+
+
+client = OllamaClient()
+# Shares the backend pool with the sync client; single-flight tables stay separate
+async_client = AsyncOllamaClient(backends=client.backends)
+
+
+def call_ollama(prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+    """
+    Calls local Ollama server with given prompt.
+    Make sure 'ollama run llama3.2' works first, and pull SUMMARY_MODEL
+    (llama3.2:1b) and any model named in model_routes.json as well.
+    """
+    return client.generate(prompt, model, context, meta, options, session_id)
+
+
+def stream_ollama(prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+    """
+    Streams the reply from the local Ollama server.
+    Yields text fragments as Ollama's NDJSON chunks arrive, so the
+    caller can forward the first token before generation has finished.
+    """
+    return client.stream(prompt, model, context, meta, options, session_id)
+
+
+async def acall_ollama(prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+    """
+    Async version of call_ollama for the ASGI chat routes.
+    """
+    return await async_client.generate(prompt, model, context, meta, options, session_id)
+
+
+def astream_ollama(prompt, model=MODEL, context=None, meta=None, options=None, session_id=None):
+    """
+    Async version of stream_ollama; use with `async for`.
+    """
+    return async_client.stream(prompt, model, context, meta, options, session_id)
@@ -0,0 +1,124 @@
+# metrics.py
+import time, threading, functools
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+HELP = {
+    "chat_stage_seconds": ("summary", "Seconds spent in each stage of a chat turn."),
+    "ollama_tokens_per_second": ("summary", "Generation speed reported by Ollama (eval_count / eval_duration)."),
+    "ollama_prompt_tokens_total": ("counter", "Prompt tokens evaluated by Ollama."),
+    "ollama_eval_tokens_total": ("counter", "Tokens generated by Ollama."),
+    "chat_errors_total": ("counter", "Failed stages of a chat turn."),
+}
+
+# Ollama reports these durations in nanoseconds
+OLLAMA_STAGES = {"load_duration": "ollama_load", "prompt_eval_duration": "ollama_prompt_eval",
+                 "eval_duration": "ollama_eval"}
+
+
+class Summary:
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+
+class Metrics:
+    """
+    Timings and counters for the chat path in Prometheus text format.
+    Recording is an append under a lock; p50/p95/p99 are computed over the
+    last `window` observations of each series only when /metrics is
+    scraped, next to a running sum and count.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.summaries = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _series(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._series(name, labels)
+        with self.lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                summary = self.summaries[key] = Summary(self.window)
+            summary.samples.append(value)
+            summary.count += 1
+            summary.sum += value
+
+    def inc(self, name, value=1, **labels):
+        key = self._series(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("chat_stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def timed(self, stage):
+        """Decorator form of timer()."""
+        def wrap(fn):
+            @functools.wraps(fn)
+            def timed_fn(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return timed_fn
+        return wrap
+
+    def record_ollama(self, meta):
+        """Records the timings and token counts from Ollama's final response."""
+        for field, stage in OLLAMA_STAGES.items():
+            if meta.get(field):
+                self.observe("chat_stage_seconds", meta[field] / 1e9, stage=stage)
+        model = meta.get("model", "")
+        if meta.get("prompt_eval_count"):
+            self.inc("ollama_prompt_tokens_total", meta["prompt_eval_count"], model=model)
+        if meta.get("eval_count"):
+            self.inc("ollama_eval_tokens_total", meta["eval_count"], model=model)
+            if meta.get("eval_duration"):
+                self.observe("ollama_tokens_per_second", meta["eval_count"] / (meta["eval_duration"] / 1e9), model=model)
+
+    def render(self):
+        with self.lock:
+            summaries = [(key, sorted(s.samples), s.sum, s.count) for key, s in self.summaries.items()]
+            counters = list(self.counters.items())
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), ordered, total, count in sorted(summaries):
+            describe(name)
+            for q in QUANTILES:
+                value = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                lines.append(f"{name}{_labels(labels, quantile=q)} {value:.6g}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6g}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for (name, labels), value in sorted(counters):
+            describe(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
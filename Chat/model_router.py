@@ -0,0 +1,94 @@
+# model_router.py
+import os, json, threading
+from collections import deque, namedtuple
+
+from llama_client import MODEL, OPTIONS
+
+ROUTES_PATH = os.environ.get(
+    "MODEL_ROUTES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_routes.json")
+)
+
+CONDITIONS = {"intents", "min_words", "max_words", "min_depth", "max_depth"}
+
+Route = namedtuple("Route", ["name", "model", "options"])
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelRouter:
+    """
+    Picks the model and generation options for a chat turn from the rules
+    in model_routes.json. Rules are tried in file order and the first one
+    whose conditions all hold wins; a rule without conditions matches
+    anything. Conditions:
+
+        intents               matched intent tag is one of these ("none" = no tag)
+        min_words, max_words  length of the user's message
+        min_depth, max_depth  messages already in the conversation
+
+    A rule without "model" uses MODEL, so the defaults need nothing beyond
+    llama3.2. Pull any other model (say llama3.2:1b for check_in) on every
+    backend before naming it here: /ready waits until each routed model loads.
+
+    Each route keeps its call count, error count and recent latencies.
+    """
+
+    def __init__(self, path=ROUTES_PATH, samples=500):
+        self.path = path
+        with open(path, "r", encoding="utf-8") as f:
+            self.rules = json.load(f)["routes"]
+        if not self.rules or CONDITIONS & self.rules[-1].keys():
+            self.rules.append({"name": "fallback", "model": MODEL})
+        self.routes = [Route(rule["name"], rule.get("model", MODEL), rule.get("options", {})) for rule in self.rules]
+        self.latencies = {route.name: deque(maxlen=samples) for route in self.routes}
+        self.counters = {route.name: {"calls": 0, "errors": 0} for route in self.routes}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _matches(rule, words, tag, depth):
+        if "intents" in rule and (tag or "none") not in rule["intents"]:
+            return False
+        return (rule.get("min_words", 0) <= words <= rule.get("max_words", words)
+                and rule.get("min_depth", 0) <= depth <= rule.get("max_depth", depth))
+
+    def route(self, text, tag, depth):
+        words = len(text.split())
+        for rule, route in zip(self.rules, self.routes):
+            if self._matches(rule, words, tag, depth):
+                return route
+
+    def models(self):
+        return list(dict.fromkeys(route.model for route in self.routes))
+
+    def tightest_window(self):
+        """(num_ctx, num_predict) of the route that leaves the least room for history."""
+        windows = [dict(OPTIONS, **route.options) for route in self.routes]
+        options = min(windows, key=lambda o: o["num_ctx"] - o["num_predict"])
+        return options["num_ctx"], options["num_predict"]
+
+    def observe(self, route, seconds, ok):
+        """Records one finished call; ok=None (client went away) only counts the call."""
+        with self.lock:
+            counters = self.counters[route.name]
+            counters["calls"] += 1
+            if ok is False:
+                counters["errors"] += 1
+            elif ok:
+                self.latencies[route.name].append(seconds)
+
+    def status(self):
+        with self.lock:
+            report = {}
+            for route in self.routes:
+                samples = self.latencies[route.name]
+                report[route.name] = dict(self.counters[route.name], model=route.model, options=route.options)
+                if samples:
+                    report[route.name].update(
+                        p50=round(_percentile(samples, 0.5), 3),
+                        p95=round(_percentile(samples, 0.95), 3),
+                        max=round(max(samples), 3)
+                    )
+            return report
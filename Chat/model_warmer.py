@@ -0,0 +1,85 @@
+# model_warmer.py
+import os, time, threading
+import requests
+from llama_client import KEEP_ALIVE
+
+# Seconds between checks for idle backends whose models need a refresh
+WARM_INTERVAL = float(os.environ.get("OLLAMA_WARM_INTERVAL", "240"))
+RETRY_INTERVAL = 5.0
+
+
+class ModelWarmer:
+    """
+    Loads the chat models on every Ollama backend at startup, so the first
+    /chat after a deploy does not pay the model load. Every chat renews
+    keep_alive on its own; every interval seconds a backend that served
+    nothing since the last check gets an empty generate for each model,
+    which renews keep_alive without generating any tokens. ready() says
+    whether every model is loaded on at least one healthy backend.
+    """
+
+    def __init__(self, client, models, interval=WARM_INTERVAL, timeout=300):
+        self.client = client
+        self.models = list(dict.fromkeys(models))
+        self.interval = interval
+        self.timeout = timeout
+        self.loaded = set()  # (host, model) pairs
+        self.failing = set()
+        self.served = {}
+        self.lock = threading.Lock()
+        self.counters = {"loads": 0, "refreshes": 0, "errors": 0}
+
+    def start(self):
+        threading.Thread(target=self._loop, name="model-warmer", daemon=True).start()
+
+    def load(self, host, model, kind="loads"):
+        # An empty prompt makes Ollama load the model and return right away
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": KEEP_ALIVE}
+        try:
+            r = self.client.session.post(f"{host}/api/generate", json=payload, timeout=self.timeout)
+            r.raise_for_status()
+        except requests.RequestException as e:
+            with self.lock:
+                self.loaded.discard((host, model))
+                self.counters["errors"] += 1
+                first = (host, model) not in self.failing
+                self.failing.add((host, model))
+            if first:
+                print("ERROR: loading", model, "on", host, e)
+            return False
+
+        with self.lock:
+            self.loaded.add((host, model))
+            self.failing.discard((host, model))
+            self.counters[kind] += 1
+        return True
+
+    def warm(self):
+        """Loads whatever is not loaded yet and refreshes backends that sat idle."""
+        for backend in self.client.backends.backends:
+            if not backend.healthy:
+                with self.lock:
+                    self.loaded -= {(backend.host, model) for model in self.models}
+                continue
+            idle = backend.inflight == 0 and self.served.get(backend.host) == backend.served
+            self.served[backend.host] = backend.served
+            for model in self.models:
+                if (backend.host, model) not in self.loaded:
+                    self.load(backend.host, model)
+                elif idle:
+                    self.load(backend.host, model, "refreshes")
+
+    def ready(self):
+        healthy = [b.host for b in self.client.backends.backends if b.healthy]
+        with self.lock:
+            return all(any((host, model) in self.loaded for host in healthy) for model in self.models)
+
+    def _loop(self):
+        while True:
+            self.warm()
+            time.sleep(self.interval if self.ready() else RETRY_INTERVAL)
+
+    def status(self):
+        with self.lock:
+            loaded = sorted(f"{model}@{host}" for host, model in self.loaded)
+        return dict(self.counters, ready=self.ready(), loaded=loaded, keep_alive=KEEP_ALIVE)
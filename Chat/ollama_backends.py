@@ -0,0 +1,108 @@
+# ollama_backends.py
+import time, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import requests
+
+
+class Backend:
+    def __init__(self, host):
+        self.host = host
+        self.healthy = True
+        self.inflight = 0
+        self.failures = 0
+        self.served = 0
+
+
+class BackendPool:
+    """
+    Routes each Ollama call to the healthy backend with the fewest requests
+    in flight. A session goes back to the backend that served it last, where
+    its KV cache is warm, unless that backend is more than sticky_slack
+    requests busier than the least loaded one. A backend is ejected after
+    max_failures failed calls in a row and readmitted by the first good
+    health probe of /api/tags.
+    """
+
+    def __init__(self, hosts, probe_interval=5.0, max_failures=3, sticky_slack=2, max_sessions=10000):
+        self.backends = [Backend(host.rstrip("/")) for host in hosts]
+        self.probe_interval = probe_interval
+        self.max_failures = max_failures
+        self.sticky_slack = sticky_slack
+        self.max_sessions = max_sessions
+        self.sticky = OrderedDict()
+        self.lock = threading.Lock()
+        if len(self.backends) > 1:
+            threading.Thread(target=self._probe_loop, name="ollama-probe", daemon=True).start()
+
+    def _pick(self, session_id):
+        candidates = [b for b in self.backends if b.healthy] or self.backends
+        least = min(candidates, key=lambda b: (b.inflight, b.served))
+        host = self.sticky.get(session_id)
+        for b in candidates:
+            if b.host == host and b.inflight <= least.inflight + self.sticky_slack:
+                return b
+        return least
+
+    @contextmanager
+    def lease(self, session_id=None):
+        """Picks a backend for one call and keeps it counted as busy until the call ends."""
+        with self.lock:
+            backend = self._pick(session_id)
+            backend.inflight += 1
+            if session_id is not None:
+                self.sticky[session_id] = backend.host
+                self.sticky.move_to_end(session_id)
+                if len(self.sticky) > self.max_sessions:
+                    self.sticky.popitem(last=False)
+        try:
+            yield backend
+        except Exception:
+            self._record(backend, ok=False)
+            raise
+        except BaseException:
+            # The caller walked away (closed stream, cancelled task); says nothing about the backend
+            self._record(backend, ok=None)
+            raise
+        else:
+            self._record(backend, ok=True)
+
+    def _record(self, backend, ok):
+        with self.lock:
+            backend.inflight -= 1
+            if ok is None:
+                return
+            if ok:
+                backend.failures = 0
+                backend.served += 1
+                return
+            backend.failures += 1
+            if backend.healthy and backend.failures >= self.max_failures and len(self.backends) > 1:
+                backend.healthy = False
+                print("Ejected Ollama backend", backend.host)
+
+    def probe(self):
+        for backend in self.backends:
+            try:
+                ok = requests.get(f"{backend.host}/api/tags", timeout=2).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with self.lock:
+                if ok and not backend.healthy:
+                    print("Readmitted Ollama backend", backend.host)
+                if ok:
+                    backend.failures = 0
+                backend.healthy = ok
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            self.probe()
+
+    def status(self):
+        with self.lock:
+            return [
+                {"host": b.host, "healthy": b.healthy, "inflight": b.inflight,
+                 "failures": b.failures, "served": b.served}
+                for b in self.backends
+            ]
@@ -0,0 +1,68 @@
+# prompt_builder.py
+import os, re
+from functools import lru_cache
+
+from llama_client import OPTIONS
+
+# Total tokens a prompt may use, reply included; defaults to the model context
+PROMPT_TOKENS = int(os.environ.get("PROMPT_TOKENS", OPTIONS["num_ctx"]))
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=8192)
+def estimate_tokens(text):
+    """
+    Rough BPE-style token count: one per word or punctuation mark, plus one
+    for every further 6 characters of a long word. Cached, since the same
+    history messages are counted again on every turn.
+    """
+    return sum(1 + len(piece) // 6 for piece in TOKEN_RE.findall(text))
+
+
+def format_message(msg):
+    return f"{msg['role'].capitalize()}: {msg['content']}\n"
+
+
+def fit_history(system_prompt, messages, budget=PROMPT_TOKENS, reserve=None):
+    """
+    Returns the newest messages that fit in `budget` tokens after setting
+    aside room for the system prompt and for `reserve` reply tokens
+    (num_predict by default). The newest message is always kept.
+    """
+    reserve = OPTIONS["num_predict"] if reserve is None else reserve
+    room = budget - reserve - estimate_tokens(system_prompt)
+    picked = []
+    for msg in reversed(messages):
+        room -= estimate_tokens(format_message(msg))
+        if room < 0 and picked:
+            break
+        picked.append(msg)
+    picked.reverse()
+    return picked
+
+
+def with_summary(system_prompt, summary):
+    if not summary:
+        return system_prompt
+    return f"{system_prompt}\nSummary of the earlier conversation: {summary['text']}"
+
+
+def split_history(system_prompt, messages, summary=None, budget=PROMPT_TOKENS, reserve=None):
+    """
+    Returns (evicted, kept): the turns that no longer fit next to the system
+    prompt, summary and `reserve` reply tokens and are not summarized yet,
+    and the turns that fit.
+    """
+    fresh = messages
+    if summary:
+        # Messages stored without "at" predate timestamps, so the summary covers them
+        fresh = [msg for msg in messages if msg.get("at", 0) > summary["through"]]
+    kept = fit_history(with_summary(system_prompt, summary), fresh, budget, reserve)
+    return fresh[:len(fresh) - len(kept)], kept
+
+
+def build_history_prompt(system_prompt, messages, summary=None, budget=PROMPT_TOKENS, reserve=None):
+    _, kept = split_history(system_prompt, messages, summary, budget, reserve)
+    convo_text = "".join(format_message(msg) for msg in kept)
+    return f"{with_summary(system_prompt, summary)}\n{convo_text}Assistant:"
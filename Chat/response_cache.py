@@ -0,0 +1,84 @@
+# response_cache.py
+import os, re, json, time, random, hashlib, threading
+from collections import OrderedDict
+
+ENABLED = os.environ.get("RESPONSE_CACHE", "0") == "1"
+SAFE_INTENTS = set(os.environ.get("RESPONSE_CACHE_INTENTS", "greeting,goodbye").split(","))
+CRISIS_INTENTS = {"suicidal"}
+MAX_KEYS = int(os.environ.get("RESPONSE_CACHE_SIZE", "1000"))
+TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+VARIANTS = int(os.environ.get("RESPONSE_CACHE_VARIANTS", "3"))
+# Share of lookups on a key with fewer than VARIANTS replies that still go to the LLM
+SAMPLE = float(os.environ.get("RESPONSE_CACHE_SAMPLE", "0.2"))
+
+NOISE_RE = re.compile(r"[^\w\s]+")
+SPACE_RE = re.compile(r"\s+")
+
+
+class ResponseCache:
+    """
+    Caches LLM replies to first turns that only match safe intents, like a
+    bare "hi". A key serves a random stored reply as soon as it has one,
+    and keeps up to `variants` distinct replies: until that pool is full a
+    `sample` share of lookups misses anyway so another reply gets generated.
+    Keys expire after ttl and the least recently used go once there are
+    more than max_keys.
+    """
+
+    def __init__(self, enabled=ENABLED, safe_intents=SAFE_INTENTS, max_keys=MAX_KEYS, ttl=TTL, variants=VARIANTS,
+                 sample=SAMPLE):
+        self.enabled = enabled
+        self.safe_intents = safe_intents - CRISIS_INTENTS
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.variants = variants
+        self.sample = sample
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    def key(self, prompt, model, options=None):
+        """Key for a prompt and model; punctuation, case and spacing don't matter."""
+        normalized = SPACE_RE.sub(" ", NOISE_RE.sub("", prompt.lower())).strip()
+        raw = json.dumps([model, options, normalized], sort_keys=True)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def eligible(self, tags, first_turn):
+        """Only first turns whose every matched intent is safe; never anything crisis-tagged."""
+        return (self.enabled and first_turn and bool(tags)
+                and not CRISIS_INTENTS & set(tags) and set(tags) <= self.safe_intents)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry["created"] > self.ttl:
+                del self.entries[key]
+                self.counters["evicted"] += 1
+                entry = None
+            if not entry or not entry["replies"] or (
+                    len(entry["replies"]) < self.variants and random.random() < self.sample):
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return random.choice(entry["replies"])
+
+    def put(self, key, reply):
+        if not reply:
+            return
+        with self.lock:
+            entry = self.entries.setdefault(key, {"replies": [], "created": time.monotonic()})
+            self.entries.move_to_end(key)
+            # Calls merged by single-flight all put the same reply; keep one copy
+            if len(entry["replies"]) < self.variants and reply not in entry["replies"]:
+                entry["replies"].append(reply)
+                self.counters["stored"] += 1
+            while len(self.entries) > self.max_keys:
+                self.entries.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def status(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return dict(self.counters, enabled=self.enabled, keys=len(self.entries),
+                        hit_ratio=round(self.counters["hits"] / lookups, 3) if lookups else 0.0)
@@ -0,0 +1,73 @@
+# summarizer.py
+import os, queue, threading
+
+from llama_client import call_ollama
+from prompt_builder import split_history, format_message, PROMPT_TOKENS
+
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "llama3.2:1b")
+SUMMARY_OPTIONS = {"temperature": 0.2, "num_predict": 150}
+
+FOLD_PROMPT = (
+    "You keep a running summary of a supportive chat between a student and a mental health assistant. "
+    "Fold the new turns into the summary. Keep what the student shared about their feelings, "
+    "situation and goals, and what was suggested, in at most five sentences. "
+    "Reply with the updated summary only.\n"
+)
+
+
+class Summarizer:
+    """
+    Folds turns that no longer fit the prompt into a per-session summary on a
+    background thread, using a small model. Each pass sends only the previous
+    summary plus the turns evicted since, so its cost stays bounded however
+    long the conversation gets, and no user request waits on it.
+    Turns are evicted as if the prompt had `budget` tokens with `reserve`
+    set aside for the reply; give it the tightest window any chat prompt
+    uses, so every turn a prompt drops is already in the summary.
+    """
+
+    def __init__(self, store, system_prompt, model=SUMMARY_MODEL, budget=PROMPT_TOKENS, reserve=None):
+        self.store = store
+        self.system_prompt = system_prompt
+        self.model = model
+        self.budget = budget
+        self.reserve = reserve
+        self.queue = queue.Queue()
+        self.queued = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._loop, name="summarizer", daemon=True).start()
+
+    def submit(self, session_id):
+        with self.lock:
+            if session_id in self.queued:
+                return
+            self.queued.add(session_id)
+        self.queue.put(session_id)
+
+    def fold(self, session_id):
+        summary = self.store.get_summary(session_id)
+        evicted, _ = split_history(self.system_prompt, self.store.messages(session_id), summary,
+                                   self.budget, self.reserve)
+        # A summary records the "at" of its last turn; untimestamped (older)
+        # turns wait until a timestamped one is evicted with them
+        if not evicted or "at" not in evicted[-1]:
+            return
+
+        prompt = FOLD_PROMPT
+        if summary:
+            prompt += f"Current summary: {summary['text']}\n"
+        prompt += "New turns:\n" + "".join(format_message(msg) for msg in evicted) + "Updated summary:"
+        text = call_ollama(prompt, model=self.model, options=SUMMARY_OPTIONS)
+        self.store.set_summary(session_id, text, evicted[-1]["at"])
+
+    def _loop(self):
+        while True:
+            session_id = self.queue.get()
+            with self.lock:
+                self.queued.discard(session_id)
+            try:
+                self.fold(session_id)
+            except Exception as e:
+                print("ERROR: summarizing", session_id, e)